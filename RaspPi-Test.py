@@ -2,13 +2,16 @@
 
 import math
 from lx16a import *
+from sim_bus import initialize_bus
+from bringup import bring_up, health_check
+from telemetry import read_telemetry
 import time
 from math import sin, cos
 
 # Initializing the LX16A class
 #LX16A.initialize("/dev/cu.usbserial-110", 0.1)                   # initialize servo bus port - for MAC 
 #LX16A.initialize(COM3)                                           #   "    "    "   - for Windows 
-LX16A.initialize("/dev/ttyUSB0", 0.1)                             #   "    "    "   - for Raspberry Pi     
+initialize_bus("/dev/ttyUSB0", 0.1)                             #   "    "    "   - for Raspberry Pi (simulated bus if LX16A_SIM is set)
 
 # Set servo IDs
 try:
@@ -26,58 +29,33 @@ except ServoArgumentError as e:
     print(f"Error setting servo IDs. The servo's ID is outside the range 0 - 253 degrees. Exiting...")
     quit()
 
-# Run BOOT TEST
+# Run BOOT TEST - every servo is configured in one bus write, only the stored settings that changed are rewritten (see bringup.py)
 print("Running boot test for all servos.")
 servos = [servo1, servo2, servo3, servo4, servo5, servo6, servo7, servo8]
-for servo in servos:
-    try:
-        servo.set_vin_limits(5000, 11500)
-        servo.set_temp_limit(85)
-        servo.servo_mode()
-        servo.enable_torque()
-        servo.led_power_on()
-        servo.led_power_off()
-        servo.set_led_error_triggers(over_temperature=False, over_voltage=False, rotor_locked=False)
-        print(f"Boot test for servo {servo.get_id()} is complete.")
-        time.sleep(0.3)
-    except ServoError as e:
-        print(f"Error running the boot test. Servo {e.id_} is not responding. Exiting...")
-        quit()
-print("Boot test complete.\n")
-
-# Set servo angle limits
+angle_limits = [
+    (0, 240),       # Front Ankle
+    (81, 240),      # Front Knee
+    (0, 240),       # Left Ankle
+    (0, 240),       # Left Knee
+    (0, 240),       # Back Ankle
+    (138, 240),     # Back Knee
+    (0, 240),       # Right Ankle
+    (0, 240),       # Right Knee
+]
 try:
-    print("Setting angle limits for each servo.")
-    servo1.set_angle_limits(0, 240)     # Front Ankle
-    servo2.set_angle_limits(81, 240)    # Front Knee
-    servo3.set_angle_limits(0, 240)     # Left Ankle
-    servo4.set_angle_limits(0, 240)     # Left Knee
-    servo5.set_angle_limits(0, 240)     # Back Ankle
-    servo6.set_angle_limits(138, 240)   # Back Knee
-    servo7.set_angle_limits(0, 240)     # Right Ankle
-    servo8.set_angle_limits(0, 240)     # Right Knee 
-    print("Angle limits complete.\n")
+    bring_up(servos, vin_limits=(5000, 11500), temp_limit=85, angle_limits=angle_limits, led_error_triggers=(False, False, False))
 except ServoArgumentError as e:
-    print(f"Error setting servo angle limits. Servo {e.id_} is not responding. Either limit is out of the range or upper limit is less than lower. Exiting...")
+    print(f"Error setting servo angle limits. Servo {e.id_}: either limit is out of the range or upper limit is less than lower. Exiting...")
+    quit()
+except ServoError as e:
+    print(f"Error running the boot test. Servo {e.id_} is not responding. Exiting...")
     quit()
+print("Boot test complete.\n")
 
-# Health check - check LED error triggers and flash LED motor lights three times for each servo
+# Health check - flash the LED lights of every servo without LED error triggers three times, all servos at once
 print("Beginning servo health check.")
-servos = [servo1, servo2, servo3, servo4, servo5, servo6, servo7, servo8]
-for servo in servos:
-    try:
-        over_temp, over_voltage, rotor_locked = servo.get_led_error_triggers()
-        if not any([over_temp, over_voltage, rotor_locked]):
-            # No error detected, flash LED lights three times
-            for _ in range(3):
-                servo.led_power_on()
-                time.sleep(0.1)
-                servo.led_power_off()
-                time.sleep(0.1)
-            print(f"Servo {servo.get_id()} is ready.")
-    except ServoError as e:
-        print(f"Error checking LED error triggers for servo {servo.get_id()}. Exiting...")
-        quit()
+for servo_id in health_check(servos):
+    print(f"Servo {servo_id} is ready.")
 
 # Homing proceedure - set angles to home position 
 print("\nSetting servos to home position.")
@@ -97,13 +75,12 @@ except ServoLogicalError as e:
     print(f"The command is issued while in motor mode or while torque is disabled")
 print("All servos are set and ready for movement.\n")
 
-# Print initial angles
+# Print initial angles - one sweep of the bus reads the angle, temperature and voltage of every servo (see telemetry.py)
 print("Initial angle positions:")
 try:
-    for servo in servos:
-        servo.get_physical_angle()     # gets the physical angle of the servo - note: this angle may not be equal to the command angle LX16A.get_command_angle, such as in the case of excessive load
-        print(f"Servo {servo.get_id()} is at {servo.get_physical_angle()}.")
-        time.sleep(0.3)
+    snapshot = read_telemetry(servos)
+    for servo_id, angle, temp, vin in zip(snapshot.ids, snapshot.angles, snapshot.temps, snapshot.vins):
+        print(f"Servo {servo_id} is at {angle}. ({temp} C, {vin} mV)")
 except ServoTimeoutError as e:
     print(f"The program received less bytes than expected")
 except ServoChecksumError as e:
@@ -2,11 +2,17 @@
 
 import math
 from lx16a import *
+from sim_bus import initialize_bus
+from bringup import bring_up, health_check
+from telemetry import read_telemetry
 import time
 from math import sin, cos
+from control_loop import ControlLoop
+from cpg import CPG
+from servo_group import ServoGroup
 
 # Initializing the LX16A class
-LX16A.initialize("/dev/cu.usbserial-110", 0.1)                   # initialize servo bus port - for MAC 
+initialize_bus("/dev/cu.usbserial-110", 0.1)                   # initialize servo bus port - for MAC (simulated bus if LX16A_SIM is set)
 #LX16A.initialize("/dev/bus/usb/001", 0.1)                       # servo bus port for raspberry pi      
 #LX16A.initialize("/dev/ttyUSB0", 0.1)                           # might be bus port for pi too          
 
@@ -26,58 +32,33 @@ except ServoArgumentError as e:
     print(f"Error setting servo IDs. The servo's ID is outside the range 0 - 253 degrees. Exiting...")
     quit()
 
-# Run BOOT TEST
+# Run BOOT TEST - every servo is configured in one bus write, only the stored settings that changed are rewritten (see bringup.py)
 print("Running boot test for all servos.")
 servos = [servo1, servo2, servo3, servo4, servo5, servo6, servo7, servo8]
-for servo in servos:
-    try:
-        servo.set_vin_limits(5000, 11500)
-        servo.set_temp_limit(85)
-        servo.servo_mode()
-        servo.enable_torque()
-        servo.led_power_on()
-        servo.led_power_off()
-        servo.set_led_error_triggers(over_temperature=False, over_voltage=False, rotor_locked=False)
-        print(f"Boot test for servo {servo.get_id()} is complete.")
-        time.sleep(0.3)
-    except ServoError as e:
-        print(f"Error running the boot test. Servo {e.id_} is not responding. Exiting...")
-        quit()
-print("Boot test complete.\n")
-
-# Set servo angle limits
+angle_limits = [
+    (0, 240),       # Front Ankle
+    (81, 240),      # Front Knee
+    (0, 240),       # Left Ankle
+    (0, 240),       # Left Knee
+    (0, 240),       # Back Ankle
+    (138, 240),     # Back Knee
+    (0, 240),       # Right Ankle
+    (0, 240),       # Right Knee
+]
 try:
-    print("Setting angle limits for each servo.")
-    servo1.set_angle_limits(0, 240)     # Front Ankle
-    servo2.set_angle_limits(81, 240)    # Front Knee
-    servo3.set_angle_limits(0, 240)     # Left Ankle
-    servo4.set_angle_limits(0, 240)     # Left Knee
-    servo5.set_angle_limits(0, 240)     # Back Ankle
-    servo6.set_angle_limits(138, 240)   # Back Knee
-    servo7.set_angle_limits(0, 240)     # Right Ankle
-    servo8.set_angle_limits(0, 240)     # Right Knee 
-    print("Angle limits complete.\n")
+    bring_up(servos, vin_limits=(5000, 11500), temp_limit=85, angle_limits=angle_limits, led_error_triggers=(False, False, False))
 except ServoArgumentError as e:
-    print(f"Error setting servo angle limits. Servo {e.id_} is not responding. Either limit is out of the range or upper limit is less than lower. Exiting...")
+    print(f"Error setting servo angle limits. Servo {e.id_}: either limit is out of the range or upper limit is less than lower. Exiting...")
+    quit()
+except ServoError as e:
+    print(f"Error running the boot test. Servo {e.id_} is not responding. Exiting...")
     quit()
+print("Boot test complete.\n")
 
-# Health check - check LED error triggers and flash LED motor lights three times for each servo
+# Health check - flash the LED lights of every servo without LED error triggers three times, all servos at once
 print("Beginning servo health check.")
-servos = [servo1, servo2, servo3, servo4, servo5, servo6, servo7, servo8]
-for servo in servos:
-    try:
-        over_temp, over_voltage, rotor_locked = servo.get_led_error_triggers()
-        if not any([over_temp, over_voltage, rotor_locked]):
-            # No error detected, flash LED lights three times
-            for _ in range(3):
-                servo.led_power_on()
-                time.sleep(0.1)
-                servo.led_power_off()
-                time.sleep(0.1)
-            print(f"Servo {servo.get_id()} is ready.")
-    except ServoError as e:
-        print(f"Error checking LED error triggers for servo {servo.get_id()}. Exiting...")
-        quit()
+for servo_id in health_check(servos):
+    print(f"Servo {servo_id} is ready.")
 
 # Homing proceedure - set angles to home position 
 print("\nSetting servos to home position.")
@@ -97,13 +78,12 @@ except ServoLogicalError as e:
     print(f"The command is issued while in motor mode or while torque is disabled")
 print("All servos are set and ready for movement.\n")
 
-# Print initial angles
+# Print initial angles - one sweep of the bus reads the angle, temperature and voltage of every servo (see telemetry.py)
 print("Initial angle positions:")
 try:
-    for servo in servos:
-        servo.get_physical_angle()     # gets the physical angle of the servo - note: this angle may not be equal to the command angle LX16A.get_command_angle, such as in the case of excessive load
-        print(f"Servo {servo.get_id()} is at {servo.get_physical_angle()}.")
-        time.sleep(0.3)
+    snapshot = read_telemetry(servos)
+    for servo_id, angle, temp, vin in zip(snapshot.ids, snapshot.angles, snapshot.temps, snapshot.vins):
+        print(f"Servo {servo_id} is at {angle}. ({temp} C, {vin} mV)")
 except ServoTimeoutError as e:
     print(f"The program received less bytes than expected")
 except ServoChecksumError as e:
@@ -116,42 +96,23 @@ try:
     # Define Central Pattern Generator (CPG) parameters for each servo
     initial_angles = [145.68, 115.92, 141.84, 155.52, 114.52, 172.08, 130.56, 122.16]    # Initial angles 
     amplitudes = [20, 15, 20, 15, 20, 15, 20, 15]                                        # Amplitude of oscillation
-    phase_offsets = [0, math.pi, 0, math.pi, 0, math.pi, 0, math.pi]                     # Phase offset in radians
-    angular_frequency = 2 * math.pi / 1                                                  # Complete a cycle every 1 second
+    phase_offsets = [0, 0, 0, 0, 0, math.pi, math.pi, math.pi]                           # Phase offset in radians (servos 6 - 8 swing the other way)
+    frequency = 1                                                                        # Complete a cycle every 1 second
+
+    # Start motion - the CPG (see cpg.py) advances all 8 joint phases every tick and the frame goes out in one bus write
+    duration = 5.0                                                  # run the motion for 5 seconds
+    cpg = CPG(initial_angles, amplitudes, phase_offsets, frequency)
+    servo_group = ServoGroup(servos)
+    cpg_loop = ControlLoop(50, skip_frames=True)                    # 50 ticks per second against absolute deadlines
+    move_time = round(1000 * cpg_loop.period)                       # each move lasts until the next one arrives
 
-    # Start motion
-    start_time = time.time()    # sets the start time = current timestamp 
-    duration = 5.0              # run the motion for 5 seconds
+    def cpg_tick(frame):
+        if frame == int((duration - 1) * cpg_loop.rate_hz):
+            cpg.set_amplitude(0)                                    # ease the stride down to nothing over the last second
+        servo_group.move_frame(cpg.step(cpg_loop.period).tolist(), time=move_time)
 
-    while time.time() - start_time < duration:      # while the current time stamp - start time is less than 5 seconds, run the code
-        current_time = time.time() - start_time     # current time = time stamp - start time 
-        # Move front and back legs
-        servo1_angle = 145.68 + (20 * math.sin((2 * math.pi / 1) * current_time + 0))
-        servo1.move(servo1_angle, time=100)
-        #print(f"Servo 1 is at {servo1_angle}. degrees")
-        servo2_angle = 115.92 + (15 * math.sin((2 * math.pi / 1) * current_time + 0))
-        servo2.move(servo2_angle, time=100)
-        #print(f"Servo 2 is at {servo2_angle}. degrees")
-        servo5_angle = 114.52 + (20 * math.sin((2 * math.pi / 1) * current_time + 0))
-        servo5.move(servo5_angle, time=100)
-        #print(f"Servo 5 is at {servo5_angle}.")
-        servo6_angle = 172.08 - (15 * math.sin((2 * math.pi / 1) * current_time + 0))
-        servo6.move(servo6_angle, time=100)
-        #print(f"Servo 6 is at {servo6_angle}.")
-        time.sleep(0.25)
-        servo3_angle = 141.84 + (20 * math.sin((2 * math.pi / 1) * current_time + 0))
-        servo3.move(servo3_angle, time=100)
-        #print(f"Servo 3 is at {servo3_angle} degrees.")
-        servo4_angle = 155.52 + (15 * math.sin((2 * math.pi / 1) * current_time + 0))
-        servo4.move(servo4_angle, time=100)
-        #print(f"Servo 4 is at {servo4_angle}.")
-        servo7_angle = 130.56 - (20 * math.sin((2 * math.pi / 1) * current_time + 0))
-        servo7.move(servo7_angle, time=100)
-        #print(f"Servo 7 is at {servo7_angle}.")
-        servo8_angle = 122.16 - (15 * math.sin((2 * math.pi / 1) * current_time + 0))
-        servo8.move(servo8_angle, time=100)
-        #print(f"Servo 8 is at {servo8_angle}.")
-        time.sleep(0.25)                
+    cpg_loop.run(cpg_tick, duration=duration)
+    print(cpg_loop.report())
     time.sleep(0.25)
 
     # Set servos back to home position
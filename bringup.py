@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+
+# Servo bring-up - boot test and health check for all servos at once
+# The scripts used to configure one servo at a time with a time.sleep(0.3) after each, then flash each LED three times in turn,
+# which took several seconds before the robot could move. Here the configuration writes for every servo are packed into one
+# buffer and sent back-to-back, the settings are read back in a single pass over the servos, and the LEDs flash together.
+# The settings stored in the servos' EEPROM (limits and LED error triggers) are only written when they differ from what is
+# there, and the last verified settings are cached in servo_config_cache.json so the next launch can skip reading them.
+# The cache is kept per serial port, and the simulated bus (sim_bus.py) is never cached, so a simulated run cannot vouch for the
+# settings of the real servos.
+
+import json
+import os
+import time
+
+from bus_arbiter import CONFIG
+from lx16a import *
+from lx16a_protocol import *
+
+DEFAULT_VIN_LIMITS = (5000, 11500)                      # millivolts
+DEFAULT_TEMP_LIMIT = 85                                 # degrees Celsius
+DEFAULT_LED_ERROR_TRIGGERS = (False, False, False)      # over temperature, over voltage, rotor locked
+CONFIG_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "servo_config_cache.json")
+
+
+# Function to check the settings the same way the lx16a setters do - raises ServoArgumentError for a bad value
+def _check_settings(servo_id, vin_limits, temp_limit, angle_limits):
+    lower, upper = vin_limits
+    if not 4500 <= lower <= upper <= 12000:
+        raise ServoArgumentError(f"Servo {servo_id}: voltage limits must be between 4500 and 12000 with lower <= upper (received {vin_limits})", servo_id)
+    if not 50 <= temp_limit <= 100:
+        raise ServoArgumentError(f"Servo {servo_id}: temperature limit must be between 50 and 100 (received {temp_limit})", servo_id)
+    if angle_limits is not None:
+        lower, upper = angle_limits
+        if not 0 <= lower <= upper <= 240:
+            raise ServoArgumentError(f"Servo {servo_id}: angle limits must be between 0 and 240 with lower <= upper (received {angle_limits})", servo_id)
+
+
+# Function to get the settings a servo should have that are stored in its EEPROM - the format saved in the config cache
+def _stored_settings(vin_limits, temp_limit, angle_limits, led_error_triggers):
+    settings = {
+        "vin_limits": [int(vin_limits[0]), int(vin_limits[1])],
+        "temp_limit": int(temp_limit),
+        "led_error_triggers": [bool(trigger) for trigger in led_error_triggers],
+    }
+    if angle_limits is not None:
+        settings["angle_limits"] = [to_servo_range(angle_limits[0]), to_servo_range(angle_limits[1])]
+    return settings
+
+
+# Function to read the current value of each stored setting from the servo with the get_*(poll_hardware=True) getters
+def _read_stored_settings(servo, names):
+    settings = {}
+    for name in names:
+        if name == "vin_limits":
+            settings[name] = list(servo.get_vin_limits(poll_hardware=True))
+        elif name == "temp_limit":
+            settings[name] = servo.get_temp_limit(poll_hardware=True)
+        elif name == "led_error_triggers":
+            settings[name] = list(servo.get_led_error_triggers(poll_hardware=True))
+        elif name == "angle_limits":
+            settings[name] = [to_servo_range(limit) for limit in servo.get_angle_limits(poll_hardware=True)]
+    return settings
+
+
+# Function to pack the write of one stored setting into buf and update the library's view of the servo, as the setters do
+def _pack_stored_setting(buf, servo, name, value):
+    if name == "vin_limits":
+        buf += encode_packet(servo.get_id(), SERVO_VIN_LIMIT_WRITE, (*to_bytes(value[0]), *to_bytes(value[1])))
+        servo._vin_limits = tuple(value)
+    elif name == "temp_limit":
+        buf += encode_packet(servo.get_id(), SERVO_TEMP_MAX_LIMIT_WRITE, (value,))
+        servo._temp_limit = value
+    elif name == "led_error_triggers":
+        over_temperature, over_voltage, rotor_locked = value
+        buf += encode_packet(servo.get_id(), SERVO_LED_ERROR_WRITE, (4 * rotor_locked + 2 * over_voltage + over_temperature,))
+        servo._led_error_triggers = tuple(value)
+    elif name == "angle_limits":
+        buf += encode_packet(servo.get_id(), SERVO_ANGLE_LIMIT_WRITE, (*to_bytes(value[0]), *to_bytes(value[1])))
+        servo._angle_limits = tuple(value)
+
+
+# Function to pack the settings that reset when the servo loses power - servo mode, torque on and the LED toggled on then off
+def _pack_runtime_settings(buf, servo):
+    servo_id = servo.get_id()
+    buf += encode_packet(servo_id, SERVO_OR_MOTOR_MODE_WRITE, (0, 0, 0, 0))
+    buf += encode_packet(servo_id, SERVO_LOAD_OR_UNLOAD_WRITE, (1,))
+    buf += encode_packet(servo_id, SERVO_LED_CTRL_WRITE, (0,))
+    buf += encode_packet(servo_id, SERVO_LED_CTRL_WRITE, (1,))
+    servo._motor_mode = False
+    servo._torque_enabled = True
+    servo._led_powered = False
+
+
+# Function to get the name the servos on the bus are cached under - the device of the serial port, None for the simulated bus
+def bus_name():
+    return getattr(LX16A._controller, "port", None)     # sim_bus.SimulatedPort has no port
+
+
+# Functions to load and save the config cache - the last verified stored settings of each servo, keyed by bus name, then servo ID
+def load_config_cache(path=CONFIG_CACHE_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_config_cache(cache, path=CONFIG_CACHE_PATH):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(cache, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+# Function to configure every servo and verify the settings - raises ServoError if a servo does not respond or did not take a setting
+# angle_limits - one (lower, upper) pair in degrees per servo, or None to leave the angle limits alone
+# cache_path   - servos whose cached settings already match are not read or written (None disables the cache)
+# bus          - name the servos are cached under, default bus_name() - the cache is not used when there is none
+# refresh      - ignore the cache and read every servo, e.g. after swapping a servo for one with the same ID
+# Returns the number of stored settings that had to be written
+def bring_up(servos, vin_limits=DEFAULT_VIN_LIMITS, temp_limit=DEFAULT_TEMP_LIMIT, angle_limits=None, led_error_triggers=DEFAULT_LED_ERROR_TRIGGERS,
+             cache_path=CONFIG_CACHE_PATH, bus=None, refresh=False):
+    if angle_limits is None:
+        angle_limits = [None] * len(servos)
+    if len(angle_limits) != len(servos):
+        raise ServoArgumentError(f"Expected {len(servos)} angle limit pairs (received {len(angle_limits)})")
+    wanted = []
+    for servo, limits in zip(servos, angle_limits):
+        _check_settings(servo.get_id(), vin_limits, temp_limit, limits)
+        wanted.append(_stored_settings(vin_limits, temp_limit, limits, led_error_triggers))
+
+    # One read pass over the servos the cache does not vouch for, to find the stored settings that differ
+    bus = bus or bus_name()
+    if bus is None:
+        cache_path = None
+    cache = load_config_cache(cache_path) if cache_path else {}
+    cached = cache.get(bus, {})
+    changes = []
+    for servo, settings in zip(servos, wanted):
+        if not refresh and cached.get(str(servo.get_id())) == settings:
+            changes.append({})
+            continue
+        current = _read_stored_settings(servo, settings)
+        changes.append({name: value for name, value in settings.items() if current[name] != value})
+
+    # One bus write with the runtime settings of every servo and only the stored settings that differ
+    buf = bytearray()
+    for servo, servo_changes in zip(servos, changes):
+        _pack_runtime_settings(buf, servo)
+        for name, value in servo_changes.items():
+            _pack_stored_setting(buf, servo, name, value)
+    LX16A._controller.write(buf)
+
+    # Read back what was written in one more pass
+    for servo, servo_changes in zip(servos, changes):
+        readback = [
+            ("motor mode", servo.is_motor_mode(poll_hardware=True), False),
+            ("torque", servo.is_torque_enabled(poll_hardware=True), True),
+        ]
+        for name, actual in _read_stored_settings(servo, servo_changes).items():
+            readback.append((name, actual, servo_changes[name]))
+        for name, actual, expected in readback:
+            if actual != expected:
+                raise ServoError(f"Servo {servo.get_id()}: {name} read back as {actual} (expected {expected})", servo.get_id())
+
+    if cache_path:
+        for servo, settings in zip(servos, wanted):
+            cached[str(servo.get_id())] = settings
+        cache[bus] = cached
+        save_config_cache(cache, cache_path)
+    return sum(len(servo_changes) for servo_changes in changes)
+
+
+# Function to flash the LEDs of every servo with no LED error triggers set, all at the same time - returns the IDs of those servos
+# arbiter - BusArbiter that owns the bus, the flashes then go out at config priority so they never hold up a gait frame
+def health_check(servos, flashes=3, interval=0.1, arbiter=None):
+    ready = [servo for servo in servos if not any(servo.get_led_error_triggers())]
+    led_on = b"".join(encode_packet(servo.get_id(), SERVO_LED_CTRL_WRITE, (0,)) for servo in ready)
+    led_off = b"".join(encode_packet(servo.get_id(), SERVO_LED_CTRL_WRITE, (1,)) for servo in ready)
+    for _ in range(flashes):
+        for packets in (led_on, led_off):
+            if arbiter is not None:
+                arbiter.submit(packets, CONFIG)
+            else:
+                LX16A._controller.write(packets)
+            time.sleep(interval)
+    for servo in ready:
+        servo._led_powered = False
+    return [servo.get_id() for servo in ready]
+
+
+# Startup benchmark - bring-up of the 8 robot servos on the simulated bus has to finish in under 500 ms
+if __name__ == "__main__":
+    import sys
+    import tempfile
+
+    import sim_bus
+
+    target = 0.5
+    sim_bus.install(timeout=0.1)
+    servos = [LX16A(servo_id) for servo_id in sim_bus.ROBOT_SERVO_IDS]
+    angle_limits = [(0, 240), (0, 127), (0, 240), (0, 240), (0, 240), (138, 240), (0, 240), (0, 240)]
+
+    cache_path = os.path.join(tempfile.mkdtemp(), "servo_config_cache.json")
+
+    start = time.perf_counter()
+    written = bring_up(servos, angle_limits=angle_limits, cache_path=cache_path)
+    elapsed = time.perf_counter() - start
+    print(f"Bring-up of {len(servos)} servos: {elapsed * 1000:.1f} ms, {written} settings written (target {target * 1000:.0f} ms)")
+    print(f"Simulated bus left out of the config cache: {not os.path.exists(cache_path)}")
+
+    # The simulated bus is cached under a name of its own here, in a temporary file, to time a launch with the cache
+    bring_up(servos, angle_limits=angle_limits, cache_path=cache_path, bus="simulated")
+    start = time.perf_counter()
+    written = bring_up(servos, angle_limits=angle_limits, cache_path=cache_path, bus="simulated")
+    print(f"Bring-up with the config cache: {(time.perf_counter() - start) * 1000:.1f} ms, {written} settings written")
+
+    start = time.perf_counter()
+    ready = health_check(servos)
+    print(f"Health check of {len(ready)} servos: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    if elapsed > target:
+        print("Bring-up is slower than the target.")
+        sys.exit(1)
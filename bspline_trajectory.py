@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+
+# B-spline trajectories - a smooth periodic path per joint through a few gait keyframes, played back from a lookup table
+# The gaits so far stream angles from Python: Test_Mac_2.py jumps between the corners of a triangle wave (the velocity flips at
+# every corner) and the sine table sends all 8 servos 25 times a cycle. Here each joint follows a uniform cubic B-spline that
+# passes through the keyframes and wraps round at the end of the cycle, so position, velocity and acceleration are continuous
+# everywhere (C2), even through the joins between cycles. The spline is sampled once into a lookup table and playback just
+# advances a phase and reads the table. Because the path is smooth, the servos' own linear move between two commands follows it
+# closely even with few commands per cycle - writes_per_cycle finds how few for a given tolerance, and each command is then sent
+# with a move time as long as the gap to the next one.
+# LX16A.set_bspline / move_bspline are meant for this, but the library's _BSpline does not run (weight() calls itself with the
+# wrong arguments) and it would still be one bus write per servo per move, so the spline is evaluated here with NumPy.
+
+import numpy as np
+
+
+# Function to get the control points of the periodic cubic B-spline that passes through the keyframes
+# keyframes is (K, J) - K frames evenly spaced over one cycle, J joints. Returns (K, J) control points.
+# At knot i the spline is (P[i-1] + 4 P[i] + P[i+1]) / 6, so the control points solve a cyclic tridiagonal system.
+def fit_periodic_bspline(keyframes):
+    keyframes = np.asarray(keyframes, dtype=np.float64)
+    k = len(keyframes)
+    if k < 3:
+        raise ValueError("A periodic cubic B-spline needs at least 3 keyframes")
+    a = np.zeros((k, k))
+    a[np.arange(k), np.arange(k)] = 4 / 6
+    a[np.arange(k), (np.arange(k) - 1) % k] += 1 / 6
+    a[np.arange(k), (np.arange(k) + 1) % k] += 1 / 6
+    return np.linalg.solve(a, keyframes)
+
+
+# Function to evaluate a periodic cubic B-spline at phases (any shape, in cycles, wrapped to 0 - 1) - returns (..., J)
+def eval_periodic_bspline(control, phases):
+    k = len(control)
+    u = (np.asarray(phases, dtype=np.float64) % 1.0) * k
+    segment = np.floor(u).astype(np.int64)
+    t = (u - segment)[..., np.newaxis]
+    t2 = t * t
+    t3 = t2 * t
+    return (control[(segment - 1) % k] * ((1 - t) ** 3 / 6)
+            + control[segment % k] * ((3 * t3 - 6 * t2 + 4) / 6)
+            + control[(segment + 1) % k] * ((-3 * t3 + 3 * t2 + 3 * t + 1) / 6)
+            + control[(segment + 2) % k] * (t3 / 6))
+
+
+class SplineTrajectory:
+    # keyframes   - (K, J) joint angles in degrees, evenly spaced over one cycle, e.g. the frames of a gait table
+    # period      - seconds per cycle
+    # lut_samples - rows of the lookup table the spline is sampled into
+    def __init__(self, keyframes, period=1.0, lut_samples=1024):
+        self.keyframes = np.asarray(keyframes, dtype=np.float64)
+        self.period = period
+        self.control = fit_periodic_bspline(self.keyframes)
+        self.lut = eval_periodic_bspline(self.control, np.arange(lut_samples + 1) / lut_samples)   # last row repeats the first
+        self._lut_samples = lut_samples
+
+    # Function to get the joint angles at phases (any shape, in cycles) - linear between rows of the lookup table, (..., J)
+    def at(self, phase):
+        x = (np.asarray(phase, dtype=np.float64) % 1.0) * self._lut_samples
+        i = np.minimum(x.astype(np.int64), self._lut_samples - 1)
+        f = (x - i)[..., np.newaxis]
+        return self.lut[i] * (1 - f) + self.lut[i + 1] * f
+
+    # Function to find the fewest evenly spaced commands per cycle whose straight-line moves stay within tolerance degrees of the
+    # spline on every joint - the servos interpolate linearly between the angles they are sent
+    def writes_per_cycle(self, tolerance=0.5, max_writes=200):
+        fine = self.lut[:-1]
+        phases = np.arange(self._lut_samples) / self._lut_samples
+        for n in range(len(self.keyframes), max_writes + 1):
+            commands = self.at(np.arange(n + 1) / n)
+            x = phases * n
+            i = np.minimum(x.astype(np.int64), n - 1)
+            f = (x - i)[:, np.newaxis]
+            path = commands[i] * (1 - f) + commands[i + 1] * f
+            if np.abs(path - fine).max() <= tolerance:
+                return n
+        return max_writes
+
+    # Function to play the trajectory as frames - writes_per_cycle frames per cycle, starting at start_phase
+    # Pass the result to MotionRuntime.run with a runtime running at writes_per_cycle / period frames per second.
+    def frames(self, writes_per_cycle, cycles=1, start_phase=0.0):
+        table = self.at(start_phase + np.arange(writes_per_cycle) / writes_per_cycle).tolist()
+        for _ in range(cycles):
+            yield from table
+
+
+# Benchmark - bus writes per cycle and how closely the servos follow, triangle wave and sine table versus the spline
+if __name__ == "__main__":
+    import math
+    import time
+
+    from gait_table import compute_gait_table
+
+    home_angles = [147.36, 88.80, 133.68, 153.84, 115.44, 172.80, 130.56, 121.20]
+    amplitudes = [20] * 8
+    phase_offsets = [math.pi, math.pi, math.pi, 0, math.pi, math.pi, math.pi, 0]
+    tolerance = 0.5
+
+    sine_table = compute_gait_table(home_angles, amplitudes, phase_offsets, 1.0, 25)      # what Minion-Walking.py sends
+    keyframes = compute_gait_table(home_angles, amplitudes, phase_offsets, 1.0, 5)        # 5 keyframes a cycle
+    start = time.perf_counter()
+    spline = SplineTrajectory(keyframes)
+    built = time.perf_counter() - start
+    through = np.abs(spline.at(np.arange(5) / 5) - keyframes).max()
+
+    # The second difference of the lookup table is the acceleration - it has no jumps, including across the end of the cycle
+    wrapped = np.vstack([spline.lut[-3:-1], spline.lut])
+    acceleration = np.diff(wrapped, 2, axis=0)
+    jump = np.abs(np.diff(acceleration, axis=0)).max() / np.abs(acceleration).max()
+    print(f"Spline through {len(keyframes)} keyframes built in {built * 1000:.2f} ms, keyframe error {through:.1e} degrees, "
+          f"largest step in acceleration {jump * 100:.2f}% of its peak")
+
+    start = time.perf_counter()
+    for frame in range(10000):
+        spline.at(frame / 25)
+    print(f"Lookup per frame: {(time.perf_counter() - start) / 10000 * 1e6:.1f} us")
+
+    writes = spline.writes_per_cycle(tolerance)
+    print(f"Triangle wave (Test_Mac_2.py): 4 writes per cycle, velocity reverses instantly at every corner")
+    print(f"Sine table (Minion-Walking.py): {len(sine_table)} writes per cycle ({len(sine_table) * 8} servo moves)")
+    print(f"Spline: {writes} writes per cycle ({writes * 8} servo moves, {1000 // writes} ms move time) "
+          f"within {tolerance} degrees of the smooth path, {len(sine_table) / writes:.1f}x fewer than the sine table")
+    frames = list(spline.frames(writes, cycles=2))
+    print(f"Two cycles played as {len(frames)} frames, first frame {[round(a, 1) for a in frames[0]]}")
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+
+# Bus arbiter - one thread owns the servo bus and everything else hands it packets to send
+# Requests are served by priority: gait moves first, then health queries (telemetry), then LED and configuration writes. So that
+# a gait that keeps the bus busy cannot hold the others back forever, after max_burst requests in a row of a higher class while a
+# lower one was waiting, the oldest waiting request of the lower classes is sent next. A request submitted with a key replaces a
+# request with the same key that is still waiting in the queue, so a newer target for a servo overwrites the stale one instead of
+# both being sent. Queue depth and per-class latency are tracked.
+# The replaced request keeps its place in the queue, so requests queued after it without a key can be overtaken: with
+# ServoGroup.preload_frame and start, a frame preloaded while the previous preload is still waiting takes that preload's
+# place, ahead of the start broadcast queued for it. That start then starts the newer frame one frame early, the older one
+# is never sent and the next start finds nothing new to start.
+
+import threading
+import time
+from collections import deque
+
+from lx16a import LX16A, ServoTimeoutError
+from lx16a_protocol import SERVO_MOVE_TIME_WRITE, SERVO_POS_READ, bus_lock, encode_packet, to_bytes, to_servo_range
+
+GAIT, QUERY, CONFIG = range(3)                  # priority classes, lowest number is served first
+PRIORITY_NAMES = ("gait", "query", "config")
+QUERY_TIMEOUT = 2.0                             # seconds a query waits to be sent and answered before it gives up
+MAX_BURST = 4                                   # higher priority requests sent in a row before a waiting lower one gets a turn
+
+
+# One packet (or buffer of packets) waiting to go out on the bus
+class BusRequest:
+    __slots__ = ("priority", "key", "data", "reply_size", "submitted", "done", "reply", "error")
+
+    def __init__(self, priority, key, data, reply_size):
+        self.priority = priority
+        self.key = key
+        self.data = data
+        self.reply_size = reply_size
+        self.submitted = time.monotonic()
+        self.done = threading.Event()
+        self.reply = None
+        self.error = None
+
+
+# Per-class counters
+class ClassStats:
+    def __init__(self):
+        self.sent = 0                   # requests written to the bus
+        self.coalesced = 0              # requests replaced by a newer one with the same key before they were sent
+        self.total_latency = 0.0        # seconds from submit until the request was done, summed over sent requests
+        self.max_latency = 0.0
+        self.max_depth = 0              # deepest the queue has been
+
+    def mean_latency(self):
+        return self.total_latency / self.sent if self.sent else 0.0
+
+
+class BusArbiter:
+    # port      - serial port (or simulated port) to own, defaults to the one opened by LX16A.initialize
+    # max_burst - requests of a higher class sent in a row while a lower class waits before the lower class gets a turn
+    def __init__(self, port=None, max_burst=MAX_BURST):
+        self.port = port
+        self.max_burst = max_burst
+        self._burst = 0                 # requests sent in a row ahead of a waiting lower class
+        self._queues = [deque() for _ in PRIORITY_NAMES]
+        self._queued = {}               # key -> request still in a queue
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread = None
+        self.stats = [ClassStats() for _ in PRIORITY_NAMES]
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    # Function to stop the arbiter thread - requests that were never sent fail with a RuntimeError
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+        self._fail_queued(RuntimeError("Bus arbiter stopped before the request was sent"))
+
+    # Function to fail every request still waiting in a queue with error
+    def _fail_queued(self, error):
+        with self._condition:
+            for queue in self._queues:
+                while queue:
+                    request = queue.popleft()
+                    request.error = error
+                    request.done.set()
+            self._queued.clear()
+
+    # Function to queue bytes to write - returns the BusRequest, whose done event is set once it is on the bus
+    # key - requests with the same key coalesce, e.g. ("move", servo_id), None never coalesces
+    def submit(self, data, priority=GAIT, key=None, reply_size=0):
+        with self._condition:
+            if key is not None:
+                queued = self._queued.get(key)
+                if queued is not None and queued.priority == priority:
+                    queued.data = data              # keep its place in the queue, send the newest data
+                    self.stats[priority].coalesced += 1
+                    return queued
+            request = BusRequest(priority, key, data, reply_size)
+            queue = self._queues[priority]
+            queue.append(request)
+            if key is not None:
+                self._queued[key] = request
+            stats = self.stats[priority]
+            stats.max_depth = max(stats.max_depth, len(queue))
+            self._condition.notify()
+        return request
+
+    # Function to queue a move of one servo to angle (degrees) - replaces a move of the same servo that has not been sent yet
+    def move(self, servo_id, angle, time=0, priority=GAIT):
+        packet = encode_packet(servo_id, SERVO_MOVE_TIME_WRITE, (*to_bytes(to_servo_range(angle)), *to_bytes(time)))
+        return self.submit(packet, priority, ("move", servo_id))
+
+    # Function to send a query and wait for the raw answer bytes (reply_size of them, fewer if the servo timed out)
+    # Raises ServoTimeoutError if it has not been answered within timeout seconds, e.g. because the arbiter is not running
+    def query(self, packet, reply_size, priority=QUERY, timeout=QUERY_TIMEOUT):
+        request = self.submit(packet, priority, reply_size=reply_size)
+        if not request.done.wait(timeout):
+            raise ServoTimeoutError(f"Bus arbiter did not answer the query within {timeout} s")
+        if request.error is not None:
+            raise request.error
+        return request.reply
+
+    # Function to get the number of requests waiting in each class
+    def queue_depth(self):
+        return tuple(len(queue) for queue in self._queues)
+
+    # Function to format the queue and latency stats for printing
+    def report(self):
+        lines = []
+        for name, stats, depth in zip(PRIORITY_NAMES, self.stats, self.queue_depth()):
+            lines.append(f"{name:<7} sent {stats.sent:6}  coalesced {stats.coalesced:5}  queued {depth:3} (max {stats.max_depth:3})  "
+                         f"latency mean {stats.mean_latency() * 1000:7.2f} ms  max {stats.max_latency * 1000:7.2f} ms")
+        return "\n".join(lines)
+
+    # Arbiter thread - sends the oldest request of the highest priority class that has one, or after max_burst of those while
+    # a lower class waits, the oldest request of the lower classes
+    def _run(self):
+        try:
+            self._serve()
+        finally:
+            self._running = False               # whatever ended the thread, nothing waits for a request it will never send
+            self._fail_queued(RuntimeError("Bus arbiter stopped before the request was sent"))
+
+    def _serve(self):
+        while True:
+            with self._condition:
+                while self._running and not any(self._queues):
+                    self._condition.wait()
+                if not self._running:
+                    return
+                request = self._next_request()
+                if request.key is not None and self._queued.get(request.key) is request:
+                    del self._queued[request.key]       # the same key may be queued again at another priority
+
+            port = self.port or LX16A._controller
+            try:
+                with bus_lock:
+                    port.write(request.data)
+                    if request.reply_size:
+                        request.reply = port.read(request.reply_size)
+            except Exception as e:
+                request.error = e
+
+            latency = time.monotonic() - request.submitted
+            stats = self.stats[request.priority]
+            stats.sent += 1
+            stats.total_latency += latency
+            stats.max_latency = max(stats.max_latency, latency)
+            request.done.set()
+
+    # Function to take the next request to send off its queue - called with the condition held and at least one request queued
+    def _next_request(self):
+        waiting = [queue for queue in self._queues if queue]
+        if len(waiting) == 1:
+            self._burst = 0
+            return waiting[0].popleft()
+        if self._burst >= self.max_burst:
+            self._burst = 0
+            return min(waiting[1:], key=lambda queue: queue[0].submitted).popleft()
+        self._burst += 1
+        return waiting[0].popleft()
+
+
+# Benchmark - gait frames at 200 Hz, background telemetry and an LED health check sharing the simulated bus through the arbiter
+# A frame takes about 7 ms to shift out at 115200 baud, so some frames are replaced by the next one before they are sent
+# and the bus is never idle - queries and LED writes only get out because they get a turn after every MAX_BURST frames
+if __name__ == "__main__":
+    import sim_bus
+    from bringup import health_check
+    from servo_group import ServoGroup
+    from telemetry import TelemetryPoller
+
+    sim_bus.install(timeout=0.05)
+    servos = [LX16A(servo_id) for servo_id in sim_bus.ROBOT_SERVO_IDS]
+    arbiter = BusArbiter().start()
+    group = ServoGroup(servos, arbiter=arbiter)
+    poller = TelemetryPoller(servos, rate_hz=40, arbiter=arbiter)
+    poller.start()
+    flasher = threading.Thread(target=health_check, args=(servos,), kwargs={"interval": 0.05, "arbiter": arbiter}, daemon=True)
+    flasher.start()
+
+    angles = [147.36, 88.80, 133.68, 153.84, 115.44, 172.80, 130.56, 121.20]
+    for frame in range(200):
+        group.move_frame([angle + (frame % 10) for angle in angles], 10)
+        time.sleep(0.005)
+    flasher.join()
+
+    # The same servo's move queued at two priorities at once - the arbiter thread has to survive sending both
+    with arbiter._condition:
+        arbiter.move(1, angles[0], priority=CONFIG)
+        arbiter.move(1, angles[0])
+    reply = arbiter.query(encode_packet(1, SERVO_POS_READ), 8)
+    print(f"Arbiter still answering after a move queued at two priorities: {len(reply) == 8}")
+
+    poller.stop()
+    arbiter.stop()
+    print(arbiter.report())
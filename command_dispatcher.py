@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+
+# Command dispatcher - maps the keywords heard in a voice command to the action they trigger
+# process_command used to test about 80 keywords one after the other with `"word" in command`, which rescanned the transcript
+# for every keyword, matched inside other words ("hi" in "this", "rip" in "trip") and let a short keyword shadow a longer one
+# listed after it ("what" before "what are you doing"). Here every keyword is compiled at startup into one regular expression
+# with word boundaries, matched against the lower cased transcript, so the transcript is scanned once and the longest keyword
+# found wins. The keywords are laid out as a prefix tree inside the expression ("h(?:a(?:ppy|te|ha)|i|...)"), so at each word
+# the regex engine follows one branch of the tree instead of trying all 90 keywords in turn.
+# Keywords can be registered with a priority - a keyword of a higher priority anywhere in the transcript beats a longer one of a
+# lower priority, so "stop walking forward" stops.
+
+import os
+import re
+
+BASE_DIR = "/home/nprimavera/Desktop/PyLX-16A-master"
+SOUND_DIR = os.path.join(BASE_DIR, "Minion noises")
+WHISTLE_SOUND = os.path.join(BASE_DIR, "Minion whistle.wav")
+UNKNOWN_COMMAND_SOUND = os.path.join(SOUND_DIR, "What.wav")
+
+# Keywords that start and stop the gaits - matched as whole words, so every form of a word that should work is listed
+FORWARD_KEYWORDS = ("forward", "forwards", "going forward", "walk", "walks", "walking", "step", "steps", "stepping")
+BACKWARD_KEYWORDS = ("backward", "backwards")
+STOP_KEYWORDS = ("stop", "halt", "freeze")                  # cancels the motion that is running
+STOP_PRIORITY = 1                                           # stop wins over every other keyword in the same command
+
+# Sound played for each group of keywords
+SOUND_COMMANDS = [
+    (os.path.join(SOUND_DIR, "Minion hello.wav"), ("hello", "minion", "hi", "how are you", "greetings")),
+    (os.path.join(SOUND_DIR, "Minion banana.wav"), ("banana", "food", "hungry")),
+    (os.path.join(SOUND_DIR, "Minion Ta da.wav"), ("well done", "good job", "ta da", "good work")),
+    (os.path.join(SOUND_DIR, "Minion bottom.wav"), ("bottom", "ass", "butt")),
+    (os.path.join(SOUND_DIR, "Minion farting.wav"), ("fart", "smell", "rip")),
+    (os.path.join(SOUND_DIR, "Minion laughter.wav"), ("funny", "joke", "laughing", "haha")),
+    (os.path.join(SOUND_DIR, "Minion singing.wav"), ("sing", "singing", "song", "music")),
+    (os.path.join(SOUND_DIR, "Minion Yay.wav"), ("yay", "Dave", "yes", "great", "Gru", "Despicable Me")),
+    (os.path.join(SOUND_DIR, "Minion Noises 2.wav"), ("beedo",)),
+    (os.path.join(SOUND_DIR, "Kevin.wav"), ("Kevin",)),
+    (os.path.join(SOUND_DIR, "Why.wav"), ("why",)),
+    (os.path.join(SOUND_DIR, "Argh.wav"), ("argh", "uhh")),
+    (os.path.join(SOUND_DIR, "Fight.wav"), ("fight", "angry")),
+    (os.path.join(SOUND_DIR, "Pa poy.wav"), ("toy", "Pa poy")),
+    (os.path.join(SOUND_DIR, "Mini boss.wav"), ("boss", "Nico", "mini boss")),
+    (os.path.join(SOUND_DIR, "Cry.wav"), ("sad", "cry", "upset")),
+    (os.path.join(SOUND_DIR, "Moo.wav"), ("cow", "moo")),
+    (os.path.join(SOUND_DIR, "Kung Fu.wav"), ("kung fu",)),
+    (os.path.join(SOUND_DIR, "Smoochy smoochy.wav"), ("smoochy",)),
+    (os.path.join(SOUND_DIR, "No annoying sounds.wav"), ("annoying",)),
+    (os.path.join(SOUND_DIR, "Hate.wav"), ("hate", "guy", "savvas", "max", "adrian", "kuch")),
+    (os.path.join(SOUND_DIR, "Happy.wav"), ("happy", "excited")),
+    (os.path.join(SOUND_DIR, "Fluffy.wav"), ("fluffy", "stuffed animal")),
+    (os.path.join(SOUND_DIR, "King Bob.wav"), ("bob", "king")),
+    (os.path.join(SOUND_DIR, "What.wav"), ("what", "confused", "what are you doing")),
+    (WHISTLE_SOUND, ("whistle",)),
+    (os.path.join(SOUND_DIR, "Minion YMCA.wav"), ("YMCA",)),
+]
+
+
+# Function to turn a prefix tree of keywords into a regular expression - longer branches come before the end of a keyword,
+# so the longest keyword starting at a position is the one that matches
+def _trie_pattern(node):
+    branches = []
+    for char in sorted(node):
+        if char:
+            branches.append((r"\s+" if char == " " else re.escape(char)) + _trie_pattern(node[char]))
+    if not branches:
+        return ""
+    ends_here = "" in node
+    if len(branches) == 1 and not ends_here:
+        return branches[0]
+    pattern = "(?:" + "|".join(branches) + ")"
+    return pattern + "?" if ends_here else pattern
+
+
+class CommandDispatcher:
+    # fallback - called with the transcript when no keyword matches, or None to do nothing
+    def __init__(self, fallback=None):
+        self.fallback = fallback
+        self._actions = {}              # lower case keyword -> action
+        self._priorities = {}           # lower case keyword -> priority
+        self._pattern = None
+
+    # Function to register an action (called with no arguments) for one or more keywords
+    # Keywords are matched as whole words, ignoring case, and spaces in a keyword match any run of whitespace
+    # A keyword found anywhere in a transcript wins over every keyword of a lower priority, whatever their length
+    def register(self, keywords, action, priority=0):
+        if isinstance(keywords, str):
+            keywords = (keywords,)
+        for keyword in keywords:
+            keyword = " ".join(keyword.lower().split())
+            if not keyword:
+                raise ValueError("Keywords must not be empty")
+            self._actions[keyword] = action
+            self._priorities[keyword] = priority
+        self._pattern = None
+
+    # Function to get every registered keyword, e.g. as the vocabulary of a speech recognizer
+    def keywords(self):
+        return list(self._actions)
+
+    # Function to build the combined pattern - done on the first match after keywords were registered
+    def compile(self):
+        trie = {}
+        for keyword in self._actions:
+            node = trie
+            for char in keyword:
+                node = node.setdefault(char, {})
+            node[""] = {}                                           # a keyword ends here
+        self._pattern = re.compile(rf"\b{_trie_pattern(trie)}\b")            # keywords are lower case, see match
+
+    # Function to find the keyword in a transcript - returns the one of the highest priority found, the longest of those (the
+    # first of equal length), or None
+    def match(self, transcript):
+        if self._pattern is None:
+            self.compile()
+        best = None
+        best_rank = None
+        for found in self._pattern.finditer(transcript.lower()):      # lower casing once is faster than re.IGNORECASE
+            keyword = " ".join(found.group().split())
+            rank = (self._priorities[keyword], len(keyword))
+            if best_rank is None or rank > best_rank:
+                best, best_rank = keyword, rank
+        return best
+
+    # Function to run the action of the keyword in a transcript - returns the keyword, or None if the fallback ran
+    def dispatch(self, transcript):
+        keyword = self.match(transcript)
+        if keyword is None:
+            if self.fallback is not None:
+                self.fallback(transcript)
+            return None
+        self._actions[keyword]()
+        return keyword
+
+
+# Benchmark - dispatch latency over a corpus of utterances, against the old chain of substring checks
+if __name__ == "__main__":
+    import time
+
+    dispatcher = CommandDispatcher()
+    chain = []                                          # (keyword, sound) in the order the old elif chain tested them
+    for keywords, name in ((FORWARD_KEYWORDS, "forward"), (BACKWARD_KEYWORDS, "backward"), (STOP_KEYWORDS, "stop")):
+        dispatcher.register(keywords, lambda: None, STOP_PRIORITY if name == "stop" else 0)
+        chain.extend((keyword, name) for keyword in keywords)
+    for sound, keywords in SOUND_COMMANDS:
+        dispatcher.register(keywords, lambda: None)
+        chain.extend((keyword, sound) for keyword in keywords)
+
+    def elif_chain(command):
+        for keyword, action in chain:
+            if keyword in command:
+                return keyword
+        return None
+
+    corpus = [
+        "walk forward please", "can you go backwards", "hello there minion", "this is great", "what are you doing",
+        "I am so hungry I could eat a banana", "tell me a joke", "play some music", "where is Kevin", "do the YMCA",
+        "stuffed animal", "I am feeling sad today", "kung fu fighting", "nothing to see here", "the quick brown fox jumps over the lazy dog",
+        "good job little guy", "why", "mini boss is here", "let's take a trip", "you're in my class",
+        "keep walking", "take two steps", "keep going forward",
+    ]
+    for utterance in ("this is great", "what are you doing", "let's take a trip", "mini boss is here"):
+        print(f"{utterance!r:24} elif chain: {elif_chain(utterance)!r:14} dispatcher: {dispatcher.match(utterance)!r}")
+
+    # The substring checks matched "walk" inside "walking" - the whole word keywords need the other forms registered
+    for utterance in ("keep walking", "take two steps", "keep going forward", "stepping forward now"):
+        keyword = dispatcher.match(utterance)
+        print(f"{utterance!r:36} dispatcher: {keyword!r:16} {'walks' if keyword in FORWARD_KEYWORDS else 'DOES NOT WALK'}")
+
+    # A stop anywhere in the command has to win, even over a longer keyword that starts a motion
+    for utterance in ("stop walking forward", "stop going backwards", "please walk forward and then halt", "freeze minion"):
+        keyword = dispatcher.match(utterance)
+        print(f"{utterance!r:36} dispatcher: {keyword!r:10} {'stops' if keyword in STOP_KEYWORDS else 'DOES NOT STOP'}")
+
+    # A long rambling transcript with no keyword is the worst case for the elif chain, which tests every keyword against all of it
+    rambling = ["the quick brown fox jumps over the lazy dog " * 8]
+
+    repeats = 2000
+    for name, find in (("elif chain", elif_chain), ("dispatcher", dispatcher.match)):
+        for label, utterances in (("corpus", corpus), ("long miss", rambling)):
+            start = time.perf_counter()
+            for _ in range(repeats):
+                for utterance in utterances:
+                    find(utterance)
+            elapsed = time.perf_counter() - start
+            print(f"{f'{name} ({label})':24} {elapsed / (repeats * len(utterances)) * 1e6:6.2f} us per utterance")
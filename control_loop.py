@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+
+# Fixed rate control loop for servo playback - every tick is scheduled against an absolute deadline on the monotonic clock,
+# so time spent talking to the servo bus does not add up into drift the way time.sleep(0.2) after each block of moves does
+
+import time
+
+HISTOGRAM_EDGES_MS = (0.5, 1, 2, 5, 10, 20, 50, 100, 200)     # upper edge of each latency bucket, the last bucket catches everything above
+
+
+class ControlLoop:
+    # rate_hz      - ticks per second
+    # skip_frames  - if a tick overruns, jump ahead to the next deadline that has not passed instead of running late ticks back-to-back
+    # clock, sleep - injectable so the loop can be driven by a fake clock
+    def __init__(self, rate_hz, skip_frames=False, clock=time.monotonic, sleep=time.sleep):
+        if rate_hz <= 0:
+            raise ValueError("rate_hz must be positive")
+        self.rate_hz = rate_hz
+        self.period = 1.0 / rate_hz
+        self.skip_frames = skip_frames
+        self.clock = clock
+        self.sleep = sleep
+        self.reset_stats()
+
+    # Function to clear the counters and latency histogram
+    def reset_stats(self):
+        self.ticks = 0                                              # ticks that ran
+        self.overruns = 0                                           # ticks that finished after the next deadline
+        self.skipped = 0                                            # frames dropped to catch up (skip_frames only)
+        self.max_latency = 0.0                                      # worst tick latency in seconds
+        self.histogram = [0] * (len(HISTOGRAM_EDGES_MS) + 1)        # tick latency counts per bucket
+
+    # Function to run tick(frame) at the loop rate - frame is the index of the deadline being served, counted from the start
+    # Stops after num_ticks frames, after duration seconds, or when tick returns False
+    def run(self, tick, num_ticks=None, duration=None):
+        if num_ticks is None and duration is not None:
+            num_ticks = int(round(duration * self.rate_hz))
+        start = self.clock()
+        frame = 0
+        while num_ticks is None or frame < num_ticks:
+            deadline = start + frame * self.period
+            now = self.clock()
+            if now < deadline:
+                self.sleep(deadline - now)
+
+            keep_going = tick(frame)
+            finished = self.clock()
+            self._record(finished - deadline)
+            if keep_going is False:
+                break
+
+            frame += 1
+            next_deadline = start + frame * self.period
+            if finished > next_deadline:
+                self.overruns += 1
+                if self.skip_frames:
+                    late_frames = int((finished - start) / self.period) + 1 - frame    # deadlines that have already passed
+                    self.skipped += late_frames
+                    frame += late_frames
+        return self
+
+    # Function to add one tick latency (time from its deadline until it finished) to the stats
+    def _record(self, latency):
+        self.ticks += 1
+        if latency > self.max_latency:
+            self.max_latency = latency
+        latency_ms = latency * 1000
+        for i, edge in enumerate(HISTOGRAM_EDGES_MS):
+            if latency_ms <= edge:
+                self.histogram[i] += 1
+                return
+        self.histogram[-1] += 1
+
+    # Function to format the stats and latency histogram for printing
+    def report(self):
+        lines = [f"{self.ticks} ticks at {self.rate_hz} Hz, {self.overruns} overruns, {self.skipped} skipped frames, max latency {self.max_latency * 1000:.2f} ms"]
+        lower = 0
+        for edge, count in zip(HISTOGRAM_EDGES_MS + (None,), self.histogram):
+            label = f"{lower:>5} - {edge:<5} ms" if edge is not None else f"{lower:>5} +       ms"
+            lines.append(f"  {label} {count}")
+            lower = edge
+        return "\n".join(lines)
+
+
+# Run the loop against a simulated servo bus - each tick writes 8 moves with an injectable per-write latency
+if __name__ == "__main__":
+    import random
+
+    bus_latency = 0.0005        # seconds per servo write
+    spike_chance = 0.01         # chance that a write stalls for spike_latency
+    spike_latency = 0.03
+
+    def simulated_frame(frame):
+        for _ in range(8):
+            time.sleep(bus_latency + (spike_latency if random.random() < spike_chance else 0))
+
+    for skip in (False, True):
+        loop = ControlLoop(50, skip_frames=skip)
+        began = time.monotonic()
+        loop.run(simulated_frame, duration=2.0)
+        print(f"skip_frames={skip}: ran for {time.monotonic() - began:.3f} s")
+        print(loop.report())
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+
+# Central Pattern Generator - one phase oscillator per joint, coupled so they keep the gait's phase offsets, stepped as one vector
+# Test_Mac_3.py sets up CPG parameters and then works every angle out from sin(2*pi*f*t + offset). Written that way, changing the
+# frequency in the middle of a walk jumps every leg to a different point of its cycle, and changing the amplitude jumps its size.
+# Here the state is the 8 joint phases, integrated every tick:
+#   d phase_i / dt = 2*pi * frequency + coupling / 8 * sum_j sin(phase_j - phase_i - (offset_j - offset_i))
+# so a new frequency only changes how fast the phases advance from where they are, and the coupling pulls any joint that drifts
+# or is disturbed back to its offset from the others. Frequency (signed by direction, so reversing runs the gait backwards
+# through a smooth stop) and amplitude ease towards the values last set with a time constant of 1 / convergence seconds.
+# Every tick is the same fixed set of NumPy operations on preallocated arrays, so its cost does not depend on the gait or on
+# what was set - see the benchmark at the bottom.
+
+import math
+
+import numpy as np
+
+MAX_STEP = 0.01         # longest integration step in seconds, slower ticks are split into steps this long
+
+
+class CPG:
+    # initial_angles - centre of each joint's oscillation in degrees
+    # amplitudes     - degrees either side of the centre
+    # phase_offsets  - phase of each joint in radians, the coupling keeps the joints this far apart
+    # frequency      - cycles per second
+    # coupling       - how strongly the joints pull each other back to their offsets, per second
+    # convergence    - how quickly frequency and amplitude follow a change, per second
+    def __init__(self, initial_angles, amplitudes, phase_offsets, frequency=1.0, coupling=4.0, convergence=3.0):
+        self.centre = np.asarray(initial_angles, dtype=np.float64)
+        self.base_amplitudes = np.asarray(amplitudes, dtype=np.float64)
+        offsets = np.asarray(phase_offsets, dtype=np.float64)
+        n = len(self.centre)
+        self.bias = offsets[np.newaxis, :] - offsets[:, np.newaxis]     # bias[i, j] = offset_j - offset_i
+        self.coupling = coupling
+        self.convergence = convergence
+
+        self.phases = offsets.copy()                    # start locked to the offsets
+        self.amplitudes = self.base_amplitudes.copy()   # current amplitudes, easing towards _target_amplitudes
+        self.omega = 2 * math.pi * frequency            # current angular frequency, easing towards _target_omega
+        self.frequency = frequency
+        self.direction = 1
+        self._target_omega = self.omega
+        self._target_amplitudes = self.amplitudes.copy()
+        self._diff = np.empty((n, n))
+        self._dphase = np.empty(n)
+        self._angles = np.empty(n)
+        self._write_angles()
+
+    # Function to change the speed - cycles per second
+    def set_frequency(self, frequency):
+        self.frequency = frequency
+        self._target_omega = 2 * math.pi * frequency * self.direction
+
+    # Function to change the stride - scale is a multiple of the amplitudes the CPG was made with (one number or one per joint)
+    def set_amplitude(self, scale):
+        np.multiply(self.base_amplitudes, scale, out=self._target_amplitudes)
+
+    # Function to walk forwards (1) or backwards (-1) - the gait slows down, stops and runs the other way
+    def set_direction(self, direction):
+        self.direction = 1 if direction >= 0 else -1
+        self._target_omega = 2 * math.pi * self.frequency * self.direction
+
+    # Function to advance the oscillators by dt seconds - returns the joint angles in degrees
+    # The array is reused on every call, copy it (or .tolist() it) to keep it
+    def step(self, dt):
+        num_steps = max(1, math.ceil(dt / MAX_STEP))
+        h = dt / num_steps
+        ease = 1 - math.exp(-self.convergence * h)      # exact for a first order lag, stable for any step
+        gain = self.coupling / len(self.phases) * h
+        diff, dphase = self._diff, self._dphase
+        for _ in range(num_steps):
+            self.omega += (self._target_omega - self.omega) * ease
+            self.amplitudes += (self._target_amplitudes - self.amplitudes) * ease
+            np.subtract(self.phases, self.phases[:, np.newaxis], out=diff)
+            diff -= self.bias
+            np.sin(diff, out=diff)
+            diff.sum(axis=1, out=dphase)
+            dphase *= gain
+            dphase += self.omega * h
+            self.phases += dphase
+        np.remainder(self.phases, 2 * math.pi, out=self.phases)
+        return self._write_angles()
+
+    # Function to get the joint angles for the current state without advancing it
+    def angles(self):
+        return self._angles
+
+    def _write_angles(self):
+        np.sin(self.phases, out=self._angles)
+        self._angles *= self.amplitudes
+        self._angles += self.centre
+        return self._angles
+
+
+# Benchmark - cost per tick, a 100 Hz control loop, and what a change of speed or direction does to the angles sent
+if __name__ == "__main__":
+    import time
+
+    from control_loop import ControlLoop
+
+    initial_angles = [145.68, 115.92, 141.84, 155.52, 114.52, 172.08, 130.56, 122.16]    # Test_Mac_3.py's gait
+    amplitudes = [20, 15, 20, 15, 20, 15, 20, 15]
+    phase_offsets = [0, 0, 0, 0, 0, math.pi, math.pi, math.pi]
+
+    cpg = CPG(initial_angles, amplitudes, phase_offsets)
+    num_ticks = 20000
+    times = np.empty(num_ticks)
+    for i in range(num_ticks):
+        start = time.perf_counter()
+        cpg.step(0.01)
+        times[i] = time.perf_counter() - start
+    mean, worst = times.mean() * 1e6, np.percentile(times, 99.9) * 1e6
+    print(f"Tick (8 oscillators, 100 Hz step): mean {mean:.1f} us, 99.9th percentile {worst:.1f} us, "
+          f"{1e6 / mean:.0f} ticks/s possible on this CPU")
+
+    loop = ControlLoop(100)
+    loop.run(lambda frame: cpg.step(loop.period), duration=2.0)
+    print(loop.report())
+
+    # Switching from 1 to 2 Hz and then reversing, 4 seconds at 50 Hz - the largest change of velocity of any joint between two
+    # ticks (degrees per tick per tick), for the CPG and for recomputing sin(2*pi*f*t + offset) with the new f
+    rate = 50
+    cpg = CPG(initial_angles, amplitudes, phase_offsets)
+    centre, amp, offsets = np.array(initial_angles), np.array(amplitudes), np.array(phase_offsets)
+    from_cpg, from_formula = [], []
+    for frame in range(4 * rate):
+        t = frame / rate
+        if frame == 1 * rate:
+            cpg.set_frequency(2.0)
+        if frame == 2 * rate:
+            cpg.set_direction(-1)
+        frequency = 1.0 if t < 1 else (2.0 if t < 2 else -2.0)
+        from_formula.append(centre + amp * np.sin(2 * math.pi * frequency * t + offsets))
+        from_cpg.append(cpg.step(1 / rate).copy())
+    jerk_cpg = np.abs(np.diff(from_cpg, 2, axis=0)).max()
+    jerk_formula = np.abs(np.diff(from_formula, 2, axis=0)).max()
+    lock = np.abs((cpg.phases - cpg.phases[0] - offsets + math.pi) % (2 * math.pi) - math.pi).max()
+    print(f"1 Hz -> 2 Hz -> reversed: largest change of velocity {jerk_cpg:.2f} degrees/tick^2 with the CPG, {jerk_formula:.2f} "
+          f"recomputing the sine, phase offsets held to {math.degrees(lock):.3f} degrees")
+
+    cpg.phases[0] += 1.0                                # knock the front ankle a radian out of step
+    for _ in range(2 * rate):
+        cpg.step(1 / rate)
+    lock = np.abs((cpg.phases - cpg.phases[0] - offsets + math.pi) % (2 * math.pi) - math.pi).max()
+    print(f"Front ankle knocked 57 degrees out of phase, back within {math.degrees(lock):.2f} degrees after 2 seconds")
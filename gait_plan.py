@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+
+# Gait plans - gaits described as data in gaits/*.json and compiled into a table of frames, cached by the content of the file
+# Every script hard-coded its own gait, and adding one meant adding code. A gait file lists groups of legs, each with a phase
+# and the amplitude, centre offset and extra phase of its ankle and knee:
+#   period  - seconds per cycle
+#   duty    - fraction of the cycle spent on the first half of each joint's wave (the stance), 0.5 for a plain sine
+#   reverse - play the cycle backwards, e.g. to walk backwards with the forward gait's pattern
+#   groups  - [{"legs": ["front", "back"], "phase": 0.5, "ankle": {"amplitude": 20}, "knee": {"amplitude": 20, "phase": -0.5}}]
+# Phases are in cycles (0.5 is half a cycle, pi radians in gait_table.py), amplitudes and offsets in degrees.
+# Each servo follows home + offset + amplitude * sin(2*pi * warp(t / period + phase)), where warp stretches the stance part of
+# the cycle to duty. The frames are compiled into one (frames, 8) array, saved in gait_cache/ under a hash of the file's bytes,
+# the home angles and the frame rate, and kept in memory once loaded - so loading a gait again costs microseconds.
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from gait_table import CACHE_DIR, NUM_SERVOS, cached_table
+
+GAIT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gaits")
+PLAN_VERSION = 1                                    # part of the cache key, change it when compute_gait_plan changes
+LEG_SERVOS = {"front": 0, "left": 2, "back": 4, "right": 6}     # index of each leg's ankle servo, its knee servo is the next one
+JOINTS = ("ankle", "knee")
+JOINT_FIELDS = ("amplitude", "offset", "phase")
+
+_plans = {}             # cache key -> compiled plan, for gaits loaded before
+
+
+# Function to read the per-servo parameters out of a gait description - returns amplitudes, offsets (degrees) and phases (cycles)
+def gait_params(spec):
+    amplitudes = np.zeros(NUM_SERVOS)
+    offsets = np.zeros(NUM_SERVOS)
+    phases = np.zeros(NUM_SERVOS)
+    for group in spec["groups"]:
+        for leg in group["legs"]:
+            if leg not in LEG_SERVOS:
+                raise ValueError(f"Unknown leg {leg!r} in gait {spec.get('name')!r}, the legs are {list(LEG_SERVOS)}")
+            for j, joint in enumerate(JOINTS):
+                params = group.get(joint, {})
+                unknown = set(params) - set(JOINT_FIELDS)
+                if unknown:
+                    raise ValueError(f"Unknown {joint} fields {sorted(unknown)} in gait {spec.get('name')!r}")
+                servo = LEG_SERVOS[leg] + j
+                amplitudes[servo] = params.get("amplitude", 0.0)
+                offsets[servo] = params.get("offset", 0.0)
+                phases[servo] = group.get("phase", 0.0) + params.get("phase", 0.0)
+    return amplitudes, offsets, phases
+
+
+# Function to compile a gait description into frames - one row per frame, one column per servo (angles in degrees)
+def compute_gait_plan(spec, home_angles, rate_hz=25):
+    period = float(spec.get("period", 1.0))
+    duty = float(spec.get("duty", 0.5))
+    if not 0 < duty < 1:
+        raise ValueError(f"duty must be between 0 and 1, not {duty}")
+    num_frames = int(round(period * rate_hz))
+    if num_frames < 1:
+        raise ValueError("period * rate_hz must give at least one frame per cycle")
+    amplitudes, offsets, phases = gait_params(spec)
+
+    t = np.arange(num_frames) / num_frames
+    if spec.get("reverse", False):
+        t = -t
+    cycle = (t[:, np.newaxis] + phases) % 1.0
+    warped = np.where(cycle < duty, 0.5 * cycle / duty, 0.5 + 0.5 * (cycle - duty) / (1 - duty))
+    plan = np.empty((num_frames, NUM_SERVOS))
+    np.sin(2 * np.pi * warped, out=plan)
+    plan *= amplitudes
+    plan += np.asarray(home_angles, dtype=np.float64) + offsets
+    return plan
+
+
+# Function to load a gait file as a compiled plan - from memory, the disk cache, or compiled and cached the first time
+# The plan is read-only, it is shared by every caller that loads the same gait
+def load_gait(path, home_angles, rate_hz=25, cache_dir=CACHE_DIR):
+    if not os.path.dirname(path) and not os.path.exists(path):
+        path = os.path.join(GAIT_DIR, path if path.endswith(".json") else f"{path}.json")
+    with open(path, "rb") as f:
+        data = f.read()
+    key = hashlib.sha1(data + json.dumps([PLAN_VERSION, [float(a) for a in home_angles], float(rate_hz)]).encode()).hexdigest()
+    plan = _plans.get(key)
+    if plan is None:
+        plan = cached_table(f"gait_{key}", lambda: compute_gait_plan(json.loads(data), home_angles, rate_hz), cache_dir)
+        plan.flags.writeable = False
+        _plans[key] = plan
+    return plan
+
+
+# Benchmark - compiling every gait in gaits/, then loading it from the disk cache and from memory
+if __name__ == "__main__":
+    import math
+    import tempfile
+    import time
+
+    from gait_table import compute_gait_table
+
+    home_angles = [147.36, 88.80, 133.68, 153.84, 115.44, 172.80, 130.56, 121.20]
+    cache_dir = tempfile.mkdtemp()
+    for name in sorted(os.listdir(GAIT_DIR)):
+        path = os.path.join(GAIT_DIR, name)
+        start = time.perf_counter()
+        plan = load_gait(path, home_angles, 25, cache_dir)
+        compiled = time.perf_counter() - start
+        _plans.clear()
+        start = time.perf_counter()
+        load_gait(path, home_angles, 25, cache_dir)
+        from_disk = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(1000):
+            load_gait(path, home_angles, 25, cache_dir)
+        from_memory = (time.perf_counter() - start) / 1000
+        print(f"{name:16} {len(plan):3} frames: compiled in {compiled * 1e6:5.0f} us, from disk {from_disk * 1e6:4.0f} us, "
+              f"from memory {from_memory * 1e6:4.1f} us")
+
+    forward = load_gait("forward", home_angles, 25, cache_dir)
+    sine = compute_gait_table(home_angles, [20] * 8, [math.pi, math.pi, math.pi, 0, math.pi, math.pi, math.pi, 0], 1.0, 25)
+    backward = load_gait("backward", home_angles, 25, cache_dir)
+    print(f"forward.json matches Minion-Walking.py's sine gait: {np.allclose(forward, sine)}, "
+          f"backward.json is it played in reverse: {np.allclose(backward, np.roll(forward[::-1], 1, axis=0))}")
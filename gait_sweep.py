@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+
+# Gait parameter sweep - scores many candidate gaits in the headless simulator, one simulator per worker process
+# Tuning the gait meant editing the amplitudes, phase offsets and period in Minion-Walking.py or Test_Mac_3.py and trying them on
+# the robot. Here every candidate is played in sim_runner.SimRunner for a fixed number of simulated seconds and scored on:
+#   distance - metres travelled forward (along x) from the start position
+#   tilt     - largest roll or pitch of the body in degrees, a stability measure (the robot has fallen over well before 90)
+#   energy   - joules of mechanical work done by the motors
+# Candidates are spread over a process pool. Each worker builds its own DIRECT physics client once in the pool initializer and
+# reuses it for every candidate it is given, so the URDF is loaded once per process, not once per candidate. The results are
+# saved as one array per column (.npz) so they load straight into NumPy for sorting and plotting.
+#
+# Usage: gait_sweep.py [--workers 4] [--seconds 5] [--out gait_sweep.npz] [--urdf myrobot.urdf] [--scaling]
+
+import itertools
+import math
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from gait_table import NUM_SERVOS, compute_gait_table
+from sim_runner import ROBOT_URDF, STAND_IN_JOINTS, STAND_IN_URDF, TIME_STEP, SimRunner, table_controller
+
+HOME_ANGLES = [147.36, 88.80, 133.68, 153.84, 115.44, 172.80, 130.56, 121.20]     # home position of servos 1 - 8 (Minion-Walking.py)
+FORWARD_PHASES = (math.pi, math.pi, math.pi, 0, math.pi, math.pi, math.pi, 0)    # Minion-Walking.py's forward gait
+TROT_PHASES = (0, 0, math.pi, math.pi, math.pi, math.pi, 0, 0)                    # diagonal legs together
+
+# One candidate gait - 8 amplitudes in degrees, 8 phase offsets in radians and the cycle length in seconds
+GaitParams = namedtuple("GaitParams", ["amplitudes", "phase_offsets", "period"])
+
+# Scores of one candidate, see the top of the file
+GaitScore = namedtuple("GaitScore", ["distance", "tilt", "energy"])
+
+
+# Function to build every combination of the given values - the first amplitude is used for servos 1, 3, 5, 7 and the second for
+# servos 2, 4, 6, 8 (the two servos of each leg)
+def gait_grid(first_amplitudes, second_amplitudes, periods, phase_patterns):
+    return [GaitParams((first, second) * (NUM_SERVOS // 2), tuple(phases), period)
+            for first, second, period, phases in itertools.product(first_amplitudes, second_amplitudes, periods, phase_patterns)]
+
+
+_runner = None          # the SimRunner of this worker process
+_settings = None        # (home_angles, duration, control_rate) of this worker process
+
+
+# Pool initializer - runs once in every worker process
+def _init_worker(urdf, joint_names, home_angles, duration, control_rate):
+    global _runner, _settings
+    _runner = SimRunner(urdf, joint_names, start_position=(0, 0, 0.3))
+    _settings = (home_angles, duration, control_rate)
+
+
+# Function to play one candidate in this process's simulator and score it
+def evaluate(params):
+    home_angles, duration, control_rate = _settings
+    table = compute_gait_table(home_angles, params.amplitudes, params.phase_offsets, params.period, control_rate)
+    controller = table_controller(table.tolist(), home_angles)
+    frame_time = 1 / control_rate
+    totals = [0.0, 0.0]     # max tilt, energy
+
+    def on_step(runner):
+        _, (roll, pitch, _) = runner.base_pose()
+        _, power = runner.joint_state()
+        totals[0] = max(totals[0], abs(roll), abs(pitch))
+        totals[1] += power * frame_time
+
+    result = _runner.run_episode(controller, duration, control_rate, on_step)
+    return GaitScore(result.end_position[0] - result.start_position[0], math.degrees(totals[0]), totals[1])
+
+
+# Function to score every candidate on a pool of worker processes - returns the scores in the same order as the candidates
+def run_sweep(candidates, workers=None, urdf=ROBOT_URDF, joint_names=None, home_angles=HOME_ANGLES, duration=5.0, control_rate=25):
+    workers = workers or os.cpu_count()
+    chunksize = max(1, len(candidates) // (workers * 4))       # few enough round trips to the pool, still balanced at the end
+    with ProcessPoolExecutor(workers, initializer=_init_worker,
+                             initargs=(urdf, joint_names, list(home_angles), duration, control_rate)) as pool:
+        return list(pool.map(evaluate, candidates, chunksize=chunksize))
+
+
+# Function to save a sweep as columns - amplitudes and phase_offsets are (N, 8), the rest (N,)
+def save_sweep(path, candidates, scores):
+    np.savez(path,
+             amplitudes=np.array([c.amplitudes for c in candidates], dtype=np.float32),
+             phase_offsets=np.array([c.phase_offsets for c in candidates], dtype=np.float32),
+             period=np.array([c.period for c in candidates], dtype=np.float32),
+             distance=np.array([s.distance for s in scores], dtype=np.float32),
+             tilt=np.array([s.tilt for s in scores], dtype=np.float32),
+             energy=np.array([s.energy for s in scores], dtype=np.float32))
+
+
+# Function to load a saved sweep - returns a dict of column name -> array
+def load_sweep(path):
+    with np.load(path) as columns:
+        return {name: columns[name] for name in columns.files}
+
+
+# Sweep of the gait parameters around Minion-Walking.py's forward gait, with an optional throughput scaling report
+if __name__ == "__main__":
+    import argparse
+
+    import pybullet_data
+
+    parser = argparse.ArgumentParser(description="Score candidate gaits in the headless PyBullet simulator")
+    parser.add_argument("--urdf", default=ROBOT_URDF)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--seconds", type=float, default=5.0, help="simulated seconds per candidate")
+    parser.add_argument("--out", default="gait_sweep.npz")
+    parser.add_argument("--scaling", action="store_true", help="time the same candidates on 1, 2, 4... workers first")
+    args = parser.parse_args()
+
+    urdf, joint_names = args.urdf, None
+    if not os.path.exists(urdf) and not os.path.exists(os.path.join(pybullet_data.getDataPath(), urdf)):
+        print(f"{urdf} not found, using the {STAND_IN_URDF} model from pybullet_data instead")
+        urdf, joint_names = STAND_IN_URDF, STAND_IN_JOINTS
+
+    candidates = gait_grid([10, 15, 20, 25], [10, 15, 20, 25], [0.5, 0.75, 1.0], [FORWARD_PHASES, TROT_PHASES])
+    options = dict(urdf=urdf, joint_names=joint_names, duration=args.seconds)
+
+    if args.scaling:
+        sample = candidates[:max(8, args.workers * 4)]
+        base = None
+        for workers in sorted({2 ** i for i in range(args.workers.bit_length()) if 2 ** i <= args.workers} | {args.workers}):
+            start = time.perf_counter()
+            run_sweep(sample, workers, **options)
+            rate = len(sample) / (time.perf_counter() - start)
+            base = base or rate
+            print(f"{workers:3} workers: {rate:6.1f} candidates/s, {rate / base:4.1f}x one worker")
+
+    start = time.perf_counter()
+    scores = run_sweep(candidates, args.workers, **options)
+    elapsed = time.perf_counter() - start
+    save_sweep(args.out, candidates, scores)
+    steps = len(candidates) * round(args.seconds / TIME_STEP)
+    print(f"{len(candidates)} candidates on {args.workers} workers in {elapsed:.1f} s: {len(candidates) / elapsed:.1f} candidates/s, "
+          f"{steps / elapsed:.0f} simulated steps/s, saved to {args.out}")
+
+    sweep = load_sweep(args.out)
+    upright = sweep["tilt"] < 30
+    ranked = np.flatnonzero(upright)[np.argsort(-sweep["distance"][upright])][:5]
+    print(f"{upright.sum()} of {len(candidates)} stayed upright (tilt < 30 degrees), furthest forward:")
+    for i in ranked:
+        print(f"  amplitudes {sweep['amplitudes'][i][:2].tolist()} period {sweep['period'][i]:.2f} s "
+              f"{'forward' if np.allclose(sweep['phase_offsets'][i], FORWARD_PHASES) else 'trot'}: "
+              f"{sweep['distance'][i]:+.3f} m, tilt {sweep['tilt'][i]:.1f} deg, {sweep['energy'][i]:.1f} J")
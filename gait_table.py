@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+
+# Gait table compiler - precomputes the angle of every servo over one gait cycle so the playback loop only has to index into an array
+# Each servo follows angle = home + amplitude * sin(2*pi/period * t + phase offset), sampled at rate_hz frames per second
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+NUM_SERVOS = 8                                                                      # Front/Left/Back/Right ankle + knee
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gait_cache")  # compiled tables are stored here as .npy files
+
+
+# Function to build the cache key - a hash of every parameter that changes the table
+def table_key(home_angles, amplitudes, phase_offsets, period, rate_hz):
+    params = {
+        "home_angles": [float(a) for a in home_angles],
+        "amplitudes": [float(a) for a in amplitudes],
+        "phase_offsets": [float(p) for p in phase_offsets],
+        "period": float(period),
+        "rate_hz": float(rate_hz),
+    }
+    return hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+
+# Function to compute the angle table - one row per frame, one column per servo (angles in degrees)
+def compute_gait_table(home_angles, amplitudes, phase_offsets, period=1.0, rate_hz=25):
+    home_angles = np.asarray(home_angles, dtype=np.float64)
+    amplitudes = np.asarray(amplitudes, dtype=np.float64)
+    phase_offsets = np.asarray(phase_offsets, dtype=np.float64)
+    if not home_angles.shape == amplitudes.shape == phase_offsets.shape == (NUM_SERVOS,):
+        raise ValueError(f"home_angles, amplitudes and phase_offsets must each have {NUM_SERVOS} entries")
+
+    num_frames = int(round(period * rate_hz))
+    if num_frames < 1:
+        raise ValueError("period * rate_hz must give at least one frame per cycle")
+
+    t = np.arange(num_frames) / rate_hz    # timestamp of each frame within the cycle in seconds
+    table = home_angles + amplitudes * np.sin((2 * np.pi / period) * t[:, np.newaxis] + phase_offsets)
+    return table
+
+
+# Function to load a gait table from the disk cache, compiling and saving it first if it has not been built yet
+def compile_gait_table(home_angles, amplitudes, phase_offsets, period=1.0, rate_hz=25, cache_dir=CACHE_DIR):
+    key = table_key(home_angles, amplitudes, phase_offsets, period, rate_hz)
+    return cached_table(key, lambda: compute_gait_table(home_angles, amplitudes, phase_offsets, period, rate_hz), cache_dir)
+
+
+# Function to load the table saved under key from the disk cache, or build it with build() and save it
+def cached_table(key, build, cache_dir=CACHE_DIR):
+    path = os.path.join(cache_dir, f"{key}.npy")
+    try:
+        return np.load(path)
+    except (OSError, ValueError):    # not cached yet (or a truncated file) --> rebuild it
+        pass
+
+    table = build()
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, table)
+    os.replace(tmp_path, path)     # atomic so a half written table is never loaded
+    return table
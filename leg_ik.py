@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+
+# Leg inverse kinematics - servo angles from where the feet should be, for all four legs and whole trajectories at once
+# Every servo angle in the scripts is a constant worked out by hand ("Step 7/8 - Servo Angle Calculations") plus a sine offset.
+# Each leg is a planar 2 link chain hanging from the body: the knee servo at the top swings the thigh, the ankle servo at the
+# bottom of the thigh swings the foot. Link lengths are from the "Main Dimensions" slide of "Step 3 - Detailed CAD Model":
+#   thigh - 104.27 mm from the knee axis to the ankle axis
+#   foot  - 36 mm from the ankle axis to the sole
+# (the 96.8 mm hip section above the knee is fixed to the body, so it does not enter the IK).
+# Foot positions are in mm relative to the knee axis, x forward and z down, so a straight leg puts the foot at (0, 140.27).
+# The home pose (home_angles in Minion-Walking.py) is taken to be the straight leg, and a joint turning forward moves its servo
+# up or down depending on how it is mounted - the directions are the signs the Step 7 notebook gives each servo's sine (servos
+# 6, 7 and 8 move the opposite way to the rest). Both are assumptions until they are measured on the robot, and can be passed in.
+
+import numpy as np
+
+THIGH_LENGTH = 104.27               # mm, knee axis to ankle axis
+FOOT_LENGTH = 36.0                  # mm, ankle axis to sole
+HOME_ANGLES = [147.36, 88.80, 133.68, 153.84, 115.44, 172.80, 130.56, 121.20]     # servos 1 - 8, Front/Left/Back/Right ankle + knee
+DIRECTIONS = [1, 1, 1, 1, 1, -1, -1, -1]                                          # servo degrees per degree of joint rotation
+ANGLE_LIMITS = [(0, 240), (0, 127), (0, 240), (0, 240), (0, 240), (138, 240), (0, 240), (0, 240)]   # as set in Minion-Walking.py
+
+
+class LegIK:
+    # home_angles  - servo angles with every leg straight down, servos 1 - 8
+    # directions   - +1 or -1 per servo, the way the servo angle moves when its joint turns forward
+    # angle_limits - (min, max) per servo in degrees, results are clamped to them like LX16A.set_angle_limits would
+    # bend         - +1 to bend the ankle forward, -1 backward (the two solutions of each reachable foot position)
+    def __init__(self, home_angles=HOME_ANGLES, directions=DIRECTIONS, angle_limits=ANGLE_LIMITS,
+                 thigh=THIGH_LENGTH, foot=FOOT_LENGTH, bend=1):
+        self.home = np.asarray(home_angles, dtype=np.float64)
+        self.scale = np.degrees(1) * np.asarray(directions, dtype=np.float64)
+        limits = np.asarray(angle_limits, dtype=np.float64)
+        self.lower, self.upper = limits[:, 0], limits[:, 1]
+        self.thigh = thigh
+        self.foot = foot
+        self.bend = bend
+        self.min_reach = abs(thigh - foot)
+        self.max_reach = thigh + foot
+
+    # Function to solve every leg - feet is (..., 4, 2), the (x, z) of the front, left, back and right foot in mm
+    # Returns (angles, clamped): servo angles (..., 8) in servo order and a (..., 8) mask of the servos that do not put their foot
+    # where it was asked for - angles clamped to a limit, and both servos of a leg whose foot was out of reach (pulled in to the
+    # nearest reachable point on the same line from the knee).
+    def solve(self, feet):
+        feet = np.asarray(feet, dtype=np.float64)
+        x, z = feet[..., 0], feet[..., 1]
+        reach = np.hypot(x, z)
+        clipped = np.clip(reach, self.min_reach, self.max_reach)
+
+        cos_ankle = (clipped * clipped - self.thigh ** 2 - self.foot ** 2) / (2 * self.thigh * self.foot)
+        ankle = self.bend * np.arccos(np.clip(cos_ankle, -1, 1))
+        knee = np.arctan2(x, z) - np.arctan2(self.foot * np.sin(ankle), self.thigh + self.foot * np.cos(ankle))
+
+        joints = np.empty(feet.shape[:-1] + (2,))
+        joints[..., 0] = ankle              # servos 1, 3, 5, 7
+        joints[..., 1] = knee               # servos 2, 4, 6, 8
+        angles = self.home + self.scale * joints.reshape(feet.shape[:-2] + (8,))
+        clamped = (angles < self.lower) | (angles > self.upper)
+        clamped |= np.repeat(reach != clipped, 2, axis=-1)
+        np.clip(angles, self.lower, self.upper, out=angles)
+        return angles, clamped
+
+    # Function to get the foot positions (..., 4, 2) for servo angles (..., 8) - the inverse of solve
+    def feet(self, angles):
+        joints = ((np.asarray(angles, dtype=np.float64) - self.home) / self.scale).reshape(np.shape(angles)[:-1] + (4, 2))
+        ankle, knee = joints[..., 0], joints[..., 1]
+        feet = np.empty(joints.shape)
+        feet[..., 0] = self.thigh * np.sin(knee) + self.foot * np.sin(knee + ankle)
+        feet[..., 1] = self.thigh * np.cos(knee) + self.foot * np.cos(knee + ankle)
+        return feet
+
+
+# Function to build foot trajectories for a walking cycle - (num_frames, 4, 2) foot positions in mm
+# Each foot spends duty of the cycle on the ground moving back by stride, then swings forward along a half sine lift high.
+# phases are the fractions of a cycle each leg runs behind the front leg, e.g. (0, 0.5, 0.5, 0) for front and right together.
+def step_trajectory(num_frames, stride=30.0, lift=15.0, height=130.0, duty=0.5, phases=(0, 0.5, 0.5, 0)):
+    t = (np.arange(num_frames)[:, np.newaxis] / num_frames - np.asarray(phases)) % 1.0
+    stance = t < duty
+    s = np.where(stance, t / duty, (t - duty) / (1 - duty))         # progress through the current half of the cycle, 0 - 1
+    feet = np.empty((num_frames, len(phases), 2))
+    feet[..., 0] = np.where(stance, stride / 2 - stride * s, -stride / 2 + stride * s)
+    feet[..., 1] = height - np.where(stance, 0.0, lift * np.sin(np.pi * s))
+    return feet
+
+
+# Benchmark - poses solved per millisecond in one batch call, and the round trip error through the forward kinematics
+if __name__ == "__main__":
+    import time
+
+    ik = LegIK()
+    rng = np.random.default_rng(0)
+    num_poses = 200000
+    feet = np.stack([rng.uniform(-40, 40, (num_poses, 4)), rng.uniform(110, 135, (num_poses, 4))], axis=-1)
+
+    ik.solve(feet[:1000])                       # warm up
+    start = time.perf_counter()
+    angles, clamped = ik.solve(feet)
+    elapsed = time.perf_counter() - start
+    print(f"{num_poses} poses (4 legs each) in {elapsed * 1000:.1f} ms: {num_poses / (elapsed * 1000):.0f} poses/ms")
+
+    free = ~clamped.any(axis=-1)
+    error = np.abs(ik.feet(angles[free]) - feet[free]).max()
+    print(f"{free.sum()} poses in reach and within the angle limits, round trip error at most {error:.2e} mm; "
+          f"{clamped.any(axis=-1).sum()} had a foot out of reach or a servo clamped")
+
+    straight, _ = ik.solve(np.tile([0.0, THIGH_LENGTH + FOOT_LENGTH], (4, 1)))
+    print(f"Straight legs give the home pose: {np.allclose(straight, HOME_ANGLES)}")
+
+    cycle = step_trajectory(25)
+    angles, clamped = ik.solve(cycle)
+    print(f"One 25 frame step cycle: servo 1 from {angles[:, 0].min():.1f} to {angles[:, 0].max():.1f}, "
+          f"servo 2 from {angles[:, 1].min():.1f} to {angles[:, 1].max():.1f} degrees, {clamped.sum()} angles clamped")
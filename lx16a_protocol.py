@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+# LX-16A bus protocol helpers - packet layout and command numbers used by the lx16a library, so packets can be built
+# directly into buffers (several servos per serial write) instead of one LX16A method call and one write per servo
+#
+# Packet layout: 0x55 0x55 | servo ID | length | command | parameters... | checksum
+#   length   = number of parameters + 3
+#   checksum = ~(ID + length + command + parameters) & 0xFF
+
+import threading
+
+HEADER = 0x55
+BROADCAST_ID = 254                  # every servo on the bus acts on a packet sent to this ID, none of them reply
+
+# Command numbers
+SERVO_MOVE_TIME_WRITE = 1           # move now - angle (2 bytes), time in ms (2 bytes)
+SERVO_MOVE_TIME_READ = 2
+SERVO_MOVE_TIME_WAIT_WRITE = 7      # preload a move that runs on SERVO_MOVE_START
+SERVO_MOVE_TIME_WAIT_READ = 8
+SERVO_MOVE_START = 11
+SERVO_MOVE_STOP = 12
+SERVO_ID_READ = 14
+SERVO_ANGLE_OFFSET_READ = 19
+SERVO_ANGLE_LIMIT_WRITE = 20
+SERVO_ANGLE_LIMIT_READ = 21
+SERVO_VIN_LIMIT_WRITE = 22
+SERVO_VIN_LIMIT_READ = 23
+SERVO_TEMP_MAX_LIMIT_WRITE = 24
+SERVO_TEMP_MAX_LIMIT_READ = 25
+SERVO_TEMP_READ = 26
+SERVO_VIN_READ = 27
+SERVO_POS_READ = 28
+SERVO_OR_MOTOR_MODE_WRITE = 29
+SERVO_OR_MOTOR_MODE_READ = 30
+SERVO_LOAD_OR_UNLOAD_WRITE = 31
+SERVO_LOAD_OR_UNLOAD_READ = 32
+SERVO_LED_CTRL_WRITE = 33
+SERVO_LED_CTRL_READ = 34
+SERVO_LED_ERROR_WRITE = 35
+SERVO_LED_ERROR_READ = 36
+
+MOVE_PACKET_SIZE = 10               # header (2) + ID + length + command + angle (2) + time (2) + checksum
+
+# Held for every write (and write + read of a query) made by the helpers in this repo, so a background thread polling the
+# servos and the gait writing frames take turns on the bus instead of interleaving bytes
+bus_lock = threading.RLock()
+
+
+# Function to get the size in bytes of a packet with num_params parameters
+def packet_size(num_params):
+    return num_params + 6
+
+
+# Function to compute the checksum of the packet stored in buf[start:end] (end is the index of the checksum byte)
+def checksum(buf, start, end):
+    return ~sum(buf[start + 2:end]) & 0xFF
+
+
+# Function to write a packet into buf at offset - returns the offset just after the packet
+def write_packet_into(buf, offset, servo_id, command, params=()):
+    end = offset + 5 + len(params)
+    buf[offset] = HEADER
+    buf[offset + 1] = HEADER
+    buf[offset + 2] = servo_id
+    buf[offset + 3] = len(params) + 3
+    buf[offset + 4] = command
+    buf[offset + 5:end] = bytes(params)
+    buf[end] = checksum(buf, offset, end)
+    return end + 1
+
+
+# Function to encode a single packet as bytes
+def encode_packet(servo_id, command, params=()):
+    buf = bytearray(packet_size(len(params)))
+    write_packet_into(buf, 0, servo_id, command, params)
+    return bytes(buf)
+
+
+# Function to split a 16 bit value into the low and high bytes the servos expect
+def to_bytes(n):
+    return n & 0xFF, (n >> 8) & 0xFF
+
+
+# Conversions between degrees (0 - 240) and the servo's internal units (0 - 1000), same rounding as the lx16a library
+def to_servo_range(angle):
+    return round(angle * 25 / 6)
+
+
+def from_servo_range(value):
+    return value * 6 / 25
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+
+# Motion log - records every commanded servo angle without formatting or printing anything on the control loop thread
+# Printing a line per servo move on a Pi console or over SSH stretched every keyframe. Here each frame a ServoGroup sends is
+# stored as (timestamp, servo ID, angle) records in a pre-allocated NumPy buffer, and a writer thread appends full buffers to a
+# binary file while the control loop fills the other one. Console messages (e.g. "One step completed") are queued as they are
+# and printed by the writer thread too. How much is logged can be changed at any time with the verbosity attribute.
+
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+LOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "motion_logs")
+
+# One record per servo per frame - monotonic timestamp in seconds, servo ID, commanded angle in degrees
+MOTION_LOG_DTYPE = np.dtype([("t", "<f8"), ("servo", "u1"), ("angle", "<f4")])
+
+# Verbosity levels
+QUIET = 0           # nothing is recorded or printed
+MESSAGES = 1        # only console messages are printed
+RECORD = 2          # messages are printed and frames are recorded to the log file
+ECHO = 3            # frames are also printed, one line per servo, by the writer thread
+
+
+class MotionLog:
+    dtype = MOTION_LOG_DTYPE            # record layout, subclasses with other layouts override dtype, _fill, _echo and _header
+    file_prefix = "motion_log"
+
+    # path       - binary log file, appended to
+    # capacity   - records per buffer, the writer thread is woken when a buffer fills up (or every flush_interval seconds)
+    def __init__(self, path=None, capacity=4096, verbosity=RECORD, flush_interval=1.0, clock=time.monotonic):
+        if path is None:
+            os.makedirs(LOG_DIR, exist_ok=True)
+            path = os.path.join(LOG_DIR, time.strftime(f"{self.file_prefix}_%Y%m%d-%H%M%S.bin"))
+        self.path = path
+        self.verbosity = verbosity
+        self.flush_interval = flush_interval
+        self.clock = clock
+        self.dropped = 0                        # records lost because both buffers were full or still being written
+        self._buffers = [np.zeros(capacity, dtype=self.dtype) for _ in range(2)]
+        self._active = 0                        # buffer the control loop writes into
+        self._count = 0                         # records in the active buffer
+        self._full = None                       # (buffer, count) waiting for the writer thread
+        self._writing = None                    # buffer the writer thread is writing to the file, not to be filled until it is done
+        self._messages = deque()
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._write, daemon=True)
+        self._thread.start()
+        return self
+
+    # Function to stop the writer thread after it has written everything recorded so far
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+
+    # Function to record one frame - servo_ids and values (angles in servo units, 0 - 1000) are in the same order
+    # Called by ServoGroup every time a frame is commanded, see ServoGroup.listeners
+    def record_frame(self, servo_ids, values):
+        if self.verbosity < RECORD:
+            return
+        n = len(servo_ids)
+        now = self.clock()
+        with self._condition:
+            if self._count + n > len(self._buffers[self._active]):
+                if self._full is not None or self._writing is not None:    # the writer thread has not caught up, keep the older data
+                    self.dropped += n
+                    return
+                self._full = (self._buffers[self._active], self._count)
+                self._active ^= 1
+                self._count = 0
+                self._condition.notify()
+            self._fill(self._buffers[self._active][self._count:self._count + n], servo_ids, values, now)
+            self._count += n
+
+    # Function to fill in the records of one frame
+    def _fill(self, records, servo_ids, values, now):
+        records["t"] = now
+        records["servo"] = servo_ids
+        records["angle"] = values
+        records["angle"] *= 6 / 25
+
+    # Function to print records, on the writer thread
+    def _echo(self, records):
+        for t, servo_id, angle in records.tolist():
+            print(f"{t:10.3f} Servo {servo_id} commanded to {angle:.2f} degrees.")
+
+    # Function to get the bytes written at the start of a new file
+    def _header(self):
+        return b""
+
+    # Function to print a message from the writer thread - pass text that is already formatted, nothing is formatted here
+    def message(self, text):
+        if self.verbosity >= MESSAGES:
+            self._messages.append(text)
+
+    # Writer thread - appends full buffers (and the part-filled one every flush_interval) to the file and prints messages
+    def _write(self):
+        with open(self.path, "ab") as f:
+            if f.tell() == 0:
+                f.write(self._header())
+            while True:
+                with self._condition:
+                    if self._running and self._full is None:
+                        self._condition.wait(self.flush_interval)
+                    if self._full is not None:
+                        buffer, count = self._full
+                        self._full = None
+                    else:                                   # timed out or stopping - take what there is in the active buffer
+                        buffer, count = self._buffers[self._active], self._count
+                        self._active ^= 1
+                        self._count = 0
+                    self._writing = buffer
+                    running = self._running
+                while self._messages:
+                    print(self._messages.popleft())
+                if count:
+                    f.write(buffer[:count].tobytes())
+                    f.flush()
+                    if self.verbosity >= ECHO:
+                        self._echo(buffer[:count])
+                with self._condition:
+                    self._writing = None
+                    if not running and self._full is None:
+                        return
+
+
+# Function to read a motion log file back as a NumPy record array with fields t, servo and angle
+def read_motion_log(path):
+    return np.fromfile(path, dtype=MOTION_LOG_DTYPE)
+
+
+# Benchmark - time spent on the control loop thread per frame, printing a line per servo versus recording into the log
+if __name__ == "__main__":
+    import tempfile
+
+    servo_ids = list(range(1, 9))
+    values = [614, 370, 557, 641, 481, 720, 544, 505]
+    num_frames = 20000
+
+    start = time.perf_counter()
+    for frame in range(num_frames):
+        for servo_id, value in zip(servo_ids, values):
+            print(f"Servo {servo_id} is at {value * 6 / 25} degrees. Moving to min.", file=sys.stderr)
+    printing = (time.perf_counter() - start) / num_frames
+
+    path = os.path.join(tempfile.mkdtemp(), "motion_log.bin")
+    log = MotionLog(path).start()
+    recording = 0.0
+    for burst in range(0, num_frames, 250):             # 10 s of frames at 25 Hz, then a pause like the control loop's sleep
+        start = time.perf_counter()
+        for frame in range(250):
+            log.record_frame(servo_ids, values)
+        recording += time.perf_counter() - start
+        time.sleep(0.002)
+    recording /= num_frames
+    log.stop()
+
+    records = read_motion_log(path)
+    print(f"print per servo:  {printing * 1e6:7.1f} us per frame (to stderr)")
+    print(f"MotionLog:        {recording * 1e6:7.1f} us per frame, {len(records)} records written, {log.dropped} dropped")
+    print(f"First record: servo {records[0]['servo']} at {records[0]['angle']:.2f} degrees")
+    in_order = bool((np.diff(records["t"]) >= 0).all()) and (records["servo"].reshape(-1, 8) == servo_ids).all()
+    print(f"Records in order, none overwritten while the writer thread was writing them: {in_order}")
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+
+# Motion runtime - plays motions on a control loop thread of its own so the rest of the program never waits for the robot
+# forward_motion used to block the whole script for its 3 gait cycles, so no voice command (not even "stop") was acted on until
+# it finished. Here a motion is any iterable of frames (one angle per servo in degrees, one frame per tick) and run() only
+# queues it. The runtime thread sends one frame per tick and looks at new requests at the start of every tick, so a cancel or
+# a pre-empting motion takes effect on the next tick. Nothing starts or stops dead: every motion is entered with a minimum jerk
+# transition (see transition.py) from where the servos are, at the speed they are moving, into its first frame at the speed it
+# starts with, as short as max_speed allows. A cancelled motion transitions back to the home pose, a pre-empting motion takes
+# over straight from the one it replaces, and a queued motion carries on from the end of the one before.
+
+import itertools
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from control_loop import ControlLoop
+from transition import MAX_SPEED, TransitionPlanner
+
+
+# A gait table played cycles times - on_cycle(cycle) is called as the first frame of every cycle is reached
+# start_frames lets the runtime plan the transition into the motion without starting it (and calling on_cycle(0) early)
+class TableMotion:
+    def __init__(self, table, cycles=1, on_cycle=None):
+        self.table = table
+        self.cycles = cycles
+        self.on_cycle = on_cycle
+
+    # Function to get the first two frames (fewer if there are not two) without playing anything
+    def start_frames(self):
+        return list(self.table[:2]) if self.cycles > 0 else []
+
+    def __iter__(self):
+        for cycle in range(self.cycles):
+            if self.on_cycle is not None:
+                self.on_cycle(cycle)
+            yield from self.table
+
+
+# Function to play a gait table cycles times, see TableMotion
+def table_motion(table, cycles=1, on_cycle=None):
+    return TableMotion(table, cycles, on_cycle)
+
+
+# A motion queued on the runtime - done is set once it has finished, was cancelled or failed
+class MotionHandle:
+    def __init__(self, name, frames, on_done):
+        self.name = name
+        self.frames = frames
+        self.on_done = on_done
+        self.requested = time.monotonic()
+        self.started = None             # monotonic time of its first frame
+        self.cancelled = False
+        self.error = None               # the ServoError (or other exception from its frames) that stopped it, if any
+        self.done = threading.Event()
+
+    # Function to wait until the motion is over - returns False on timeout
+    def wait(self, timeout=None):
+        return self.done.wait(timeout)
+
+
+class MotionRuntime:
+    # group        - ServoGroup of the robot's servos
+    # home_angles  - pose the robot returns to when a motion is cancelled
+    # rate_hz      - frames per second
+    # max_speed    - degrees per second the transitions between motions keep under, one number or one per servo
+    # telemetry    - TelemetryRing of the same servos (TelemetryPoller.ring), so a motion started while standing starts from the
+    #                angles read back instead of the last ones sent
+    # synchronized - preload the next frame during each tick and start it with a broadcast packet (ServoGroup.preload_frame and start)
+    def __init__(self, group, home_angles, rate_hz=25, max_speed=MAX_SPEED, telemetry=None, synchronized=False):
+        self.group = group
+        self.home_angles = list(home_angles)
+        self.synchronized = synchronized
+        self.loop = ControlLoop(rate_hz, skip_frames=True)
+        self.move_time = int(1000 / rate_hz)
+        self.planner = TransitionPlanner(rate_hz, max_speed, telemetry)
+        self.reactions = deque(maxlen=100)      # seconds from a cancel or pre-empt request until the tick that acted on it
+        self._lock = threading.Lock()
+        self._requests = deque()                # (action, handle, requested) from other threads, applied at the next tick
+        self._queue = deque()                   # motions waiting for the current one to finish
+        self._current = None
+        self._frames = None                     # iterator over the frames of the current motion or transition
+        self._pending = None                    # frame pulled ahead of time, sent on the next tick
+        self._preloaded = False                 # _pending is loaded in the servos waiting for start()
+        self._last_angles = list(home_angles)   # last frame sent
+        self._velocity = np.zeros(len(self.home_angles))    # degrees per second of the last frame, zero once idle
+        self._settled_at = None                 # monotonic time the last frame sent has finished moving
+        self._last_frame = -1
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self.loop.run, args=(self._tick,), daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+
+    # Function to run a motion - after the motions already queued, or with preempt=True instead of them, cancelling the current one
+    # on_done(handle) is called on the runtime thread when the motion is over. Returns a MotionHandle
+    def run(self, frames, name="motion", preempt=False, on_done=None):
+        handle = MotionHandle(name, frames, on_done)
+        with self._lock:
+            self._requests.append(("preempt" if preempt else "queue", handle, handle.requested))
+        return handle
+
+    # Function to cancel the current motion and every queued one, returning to the home pose
+    def cancel(self):
+        with self._lock:
+            self._requests.append(("cancel", None, time.monotonic()))
+
+    # Function to check whether a motion is running or queued
+    def busy(self):
+        with self._lock:
+            return bool(self._current or self._queue or self._requests or self._frames)
+
+    # Runtime thread - apply requests, send this tick's frame, pull and preload the next one
+    # Whatever goes wrong in a tick (a servo error, or an exception from a motion's frames or callbacks) stops the current motion,
+    # never the runtime thread, so queued motions and cancel() keep working
+    def _tick(self, frame):
+        if not self._running:
+            return False
+        try:
+            self._step(frame)
+        except Exception as e:
+            print(f"Motion {self._current.name if self._current else 'transition'} stopped: {e}")
+            if self._current is not None:
+                self._current.error = e
+            self._finish(self._current)
+            self._frames = None
+            self._pending = None
+            self._preloaded = False
+        return True
+
+    def _step(self, frame):
+        with self._lock:
+            requests = list(self._requests)
+            self._requests.clear()
+        for action, handle, requested in requests:
+            if action == "queue":
+                self._queue.append(handle)
+                continue
+            self._cancel_all(home=action == "cancel")
+            if action == "preempt":
+                self._queue.append(handle)
+            self.reactions.append(time.monotonic() - requested)
+
+        # Frames the loop skipped to catch up are skipped in the motion too, so it stays on schedule
+        for _ in range(frame - self._last_frame - 1):
+            if self._pending is None:
+                break
+            self._pending = self._pull()
+            self._preloaded = False
+        self._last_frame = frame
+
+        angles = self._pending if self._pending is not None else self._pull()
+        self._pending = None
+        if angles is None:
+            self._velocity[:] = 0
+            return
+        if self._preloaded:
+            self.group.start()
+        else:
+            self.group.move_frame(angles, self.move_time)
+        np.subtract(angles, self._last_angles, out=self._velocity)
+        self._velocity *= self.loop.rate_hz
+        self._last_angles = angles
+        self._settled_at = time.monotonic() + self.move_time / 1000
+        self._pending = None
+        self._preloaded = False
+        self._pending = self._pull()
+        if self.synchronized and self._pending is not None:
+            self.group.preload_frame(self._pending, self.move_time)
+            self._preloaded = True
+
+    # Function to get the next frame - moves on to the next queued motion when the current one runs out, None when idle
+    def _pull(self):
+        while True:
+            if self._frames is not None:
+                angles = next(self._frames, None)
+                if angles is not None:
+                    return angles
+                self._frames = None
+                self._finish(self._current)
+            if not self._queue:
+                return None
+            self._current = self._queue.popleft()
+            self._current.started = time.monotonic()
+            self._frames = self._enter(self._current.frames)
+
+    # Function to get where a transition starts - the last frame sent while moving, the pose read back once the servos have stopped
+    def _start_pose(self):
+        if self._velocity.any():
+            return self._last_angles
+        return self.planner.current_pose(self._last_angles, self._settled_at)
+
+    # Function to play a motion's frames after the transition into its first one, arriving at the speed the motion starts with
+    # The first two frames are looked at with start_frames() when the motion has it (TableMotion), otherwise they are pulled
+    # before the transition plays, so anything a generator does before its first frame happens when the transition starts
+    def _enter(self, frames):
+        if hasattr(frames, "start_frames"):
+            start = frames.start_frames()
+            frames = iter(frames)
+        else:
+            frames = iter(frames)
+            start = [frame for _, frame in zip(range(2), frames)]
+            frames = itertools.chain(start, frames)         # play the pulled frames as well
+        if start:
+            end_velocity = (np.subtract(start[1], start[0]) * self.loop.rate_hz) if len(start) == 2 else 0.0
+            yield from self.planner.plan(self._start_pose(), start[0], self._velocity, end_velocity)[:-1]
+        yield from frames
+
+    # Function to stop the current and queued motions - with home, start the transition back to the home pose from the last frame
+    # sent, otherwise the next motion takes over from it
+    def _cancel_all(self, home=True):
+        for handle in [self._current] + list(self._queue):
+            if handle is not None:
+                handle.cancelled = True
+                self._finish(handle)
+        self._queue.clear()
+        if hasattr(self._frames, "close"):
+            self._frames.close()
+        self._frames = iter(self.planner.plan(self._start_pose(), self.home_angles, self._velocity)) if home else None
+        self._pending = None
+        self._preloaded = False
+
+    def _finish(self, handle):
+        if handle is None or handle.done.is_set():
+            return
+        if handle is self._current:
+            self._current = None
+        handle.done.set()
+        if handle.on_done is not None:
+            try:
+                handle.on_done(handle)
+            except Exception as e:
+                print(f"on_done of motion {handle.name} failed: {e}")
+
+
+# Reaction time benchmark - a long walk on the simulated bus is cancelled at random moments
+# With the old blocking forward_motion a "stop" was only acted on once the whole motion had finished
+if __name__ == "__main__":
+    import math
+    import random
+
+    import sim_bus
+    from gait_table import compile_gait_table
+    from lx16a import LX16A
+    from servo_group import ServoGroup
+
+    sim_bus.install(timeout=0.05)
+    servos = [LX16A(servo_id) for servo_id in sim_bus.ROBOT_SERVO_IDS]
+    group = ServoGroup(servos)
+    home_angles = [147.36, 88.80, 133.68, 153.84, 115.44, 172.80, 130.56, 121.20]
+    rate_hz = 25
+    table = compile_gait_table(home_angles, [20] * 8, [0] * 8, 1.0, rate_hz).tolist()
+    runtime = MotionRuntime(group, home_angles, rate_hz, synchronized=True).start()
+
+    random.seed(0)
+    cycles = 3
+    waits = []
+    for _ in range(10):
+        walk = runtime.run(table_motion(table, cycles), "forward")
+        time.sleep(random.uniform(0.1, cycles - 0.1))
+        cancelled_at = time.monotonic()
+        runtime.cancel()
+        walk.wait()
+        waits.append(cycles - (cancelled_at - walk.started))       # what the old blocking loop would still have had to play
+        while runtime.busy():                                       # transition back home
+            time.sleep(0.01)
+
+    queued = runtime.run(table_motion(table, 1), "forward")
+    after = runtime.run(table_motion(table, 1), "wave")
+    after.wait()
+
+    # Pre-empting a walk with a motion that starts 15 degrees away - it takes over from the moving robot, no stop at home first
+    sent = []
+    group.listeners.append(lambda ids, values: sent.append(values[:]))
+    wave = compile_gait_table(home_angles, [15] * 8, [math.pi / 2] * 8, 1.0, rate_hz).tolist()
+    runtime.run(table_motion(table, cycles), "forward")
+    time.sleep(1.75)                                            # legs 34 degrees from the wave's first frame
+    sent.clear()
+    cycle_started = []                                          # frames sent when on_cycle(0) was called
+    runtime.run(table_motion(wave, 1, lambda cycle: cycle_started.append(len(sent))), "wave", preempt=True).wait()
+
+    # A motion whose callbacks raise (like a missing whistle clip) stops, the motion queued after it still runs
+    def missing_clip(*args):
+        raise FileNotFoundError("Minion whistle.wav")
+
+    broken = runtime.run(table_motion(table, 2, on_cycle=missing_clip), "broken", on_done=missing_clip)
+    survivor = runtime.run(table_motion(table, 1), "forward")
+    survivor.wait(5)
+    runtime.stop()
+    arrived = sent.index([round(angle * 25 / 6) for angle in wave[0]])
+    peak = max(abs(b - a) for before, after in zip(sent, sent[1:arrived + 1]) for a, b in zip(before, after)) * 6 / 25 * rate_hz
+
+    reactions = sorted(runtime.reactions)
+    print(f"Stop acted on after median {reactions[len(reactions) // 2] * 1000:.0f} ms, max {reactions[-1] * 1000:.0f} ms "
+          f"(one tick is {1000 / rate_hz:.0f} ms)")
+    print(f"The blocking loop would have taken median {sorted(waits)[len(waits) // 2] * 1000:.0f} ms, max {max(waits) * 1000:.0f} ms")
+    print(f"Queued motions ran back to back: {queued.done.is_set() and not queued.cancelled}, {after.done.is_set() and not after.cancelled}")
+    print(f"Pre-empting motion reached its first frame {arrived * 1000 / rate_hz:.0f} ms after taking over, peak {peak:.0f} deg/s "
+          f"(max_speed {runtime.planner.max_speed:.0f})")
+    print(f"Its on_cycle(0) was called as its first frame came up, not when the transition started: {cycle_started == [arrived]}")
+    print(f"Motion with a failing callback stopped with {type(broken.error).__name__}, the next one still ran: "
+          f"{survivor.done.is_set() and survivor.error is None}")
+    print(runtime.loop.report().splitlines()[0])
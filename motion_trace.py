@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+
+# Motion traces - what was commanded and measured during a run, in a compact file that loads by memory mapping
+# The only record of a walk used to be console output pasted into the "Minion-Walking trial" documents. A trace file is a
+# 32 byte header followed by fixed 20 byte records, one per servo per commanded frame:
+#   frame (counts the frames commanded since the trace started), time (seconds since the trace started), servo ID,
+#   commanded angle, physical angle (degrees), temperature (C), voltage (mV)
+# The physical angle, temperature and voltage are the latest values the telemetry poller has for the servo (NaN / 0 before the
+# first one). load_trace maps the file instead of reading it, so even a trace of several hours opens straight away.
+# Frames are told apart by their frame number, never by their time, so two frames sent close together (a late tick catching up)
+# stay two frames; the time is only used to space them out again on replay.
+#
+# Usage: motion_trace.py info trace.bin
+#        motion_trace.py replay trace.bin [--speed 2] [--sim] [--port /dev/ttyUSB0]
+#        motion_trace.py bench [--hours 3]
+
+import time
+
+import numpy as np
+
+from motion_log import MotionLog, RECORD
+from telemetry import ANGLE, TEMP, VIN
+
+TRACE_MAGIC = b"MTRACE\x00\x02"
+TRACE_DTYPE = np.dtype([("frame", "<u4"), ("t", "<f4"), ("servo", "u1"), ("commanded", "<f4"), ("physical", "<f4"), ("temp", "u1"), ("vin", "<u2")])
+TRACE_HEADER_DTYPE = np.dtype([("magic", "S8"), ("record_size", "<u4"), ("reserved", "<u4"), ("rate_hz", "<f8"), ("start_time", "<f8")])
+
+
+class TraceRecorder(MotionLog):
+    dtype = TRACE_DTYPE
+    file_prefix = "motion_trace"
+
+    # poller  - TelemetryPoller whose latest samples are stored next to each commanded angle, or None for commanded angles only
+    # rate_hz - control loop rate, stored in the header as the rate to replay at
+    def __init__(self, poller=None, rate_hz=25, path=None, **log_options):
+        super().__init__(path, **log_options)
+        self.rate_hz = rate_hz
+        self.start_time = self.clock()
+        self._latest = poller.ring.latest if poller is not None else None
+        self._index = {servo_id: i for i, servo_id in enumerate(poller.reader.ids)} if poller is not None else {}
+        self._rows = {}                 # tuple of servo IDs -> rows of the telemetry ring for them
+        self._frame = 0                 # number of the next frame, counted even when it is dropped or not recorded
+
+    def record_frame(self, servo_ids, values):
+        super().record_frame(servo_ids, values)
+        self._frame += 1
+
+    def _fill(self, records, servo_ids, values, now):
+        records["frame"] = self._frame
+        records["t"] = now - self.start_time
+        records["servo"] = servo_ids
+        records["commanded"] = values
+        records["commanded"] *= 6 / 25
+        if self._latest is None:
+            records["physical"] = np.nan
+            return
+        rows = self._rows.get(tuple(servo_ids))
+        if rows is None:
+            rows = self._rows[tuple(servo_ids)] = np.array([self._index.get(servo_id, -1) for servo_id in servo_ids])
+        latest = self._latest[rows]
+        latest[rows < 0] = np.nan                               # servo the poller does not read
+        records["physical"] = latest[:, ANGLE]
+        records["temp"] = np.nan_to_num(latest[:, TEMP])
+        records["vin"] = np.nan_to_num(latest[:, VIN])
+
+    def _echo(self, records):
+        for frame, t, servo_id, commanded, physical, temp, vin in records.tolist():
+            print(f"{frame:8} {t:9.3f} Servo {servo_id} commanded to {commanded:.2f}, at {physical:.2f} degrees. ({temp} C, {vin} mV)")
+
+    def _header(self):
+        header = np.zeros((), dtype=TRACE_HEADER_DTYPE)
+        header["magic"] = TRACE_MAGIC
+        header["record_size"] = TRACE_DTYPE.itemsize
+        header["rate_hz"] = self.rate_hz
+        header["start_time"] = time.time()
+        return header.tobytes()
+
+
+# Function to open a trace - returns (header, records), records is a read-only memory map with the TRACE_DTYPE fields
+def load_trace(path):
+    header = np.fromfile(path, dtype=TRACE_HEADER_DTYPE, count=1)
+    if len(header) != 1 or header[0]["magic"] != TRACE_MAGIC or header[0]["record_size"] != TRACE_DTYPE.itemsize:
+        raise ValueError(f"{path} is not a motion trace")
+    with open(path, "rb") as f:
+        size = f.seek(0, 2) - TRACE_HEADER_DTYPE.itemsize
+    if size < TRACE_DTYPE.itemsize:
+        return header[0], np.zeros(0, dtype=TRACE_DTYPE)
+    records = np.memmap(path, dtype=TRACE_DTYPE, mode="r", offset=TRACE_HEADER_DTYPE.itemsize, shape=(size // TRACE_DTYPE.itemsize,))
+    return header[0], records
+
+
+# Function to split a trace into frames - returns the servo IDs, the times of the frames and their commanded angles
+# (one row per frame, one column per servo, NaN for a servo that was not commanded in that frame)
+def trace_frames(records):
+    servo_ids = np.unique(records["servo"])
+    new_frame = np.diff(records["frame"].astype(np.int64), prepend=-1) != 0
+    frame_of_record = np.cumsum(new_frame) - 1
+    angles = np.full((frame_of_record[-1] + 1 if len(records) else 0, len(servo_ids)), np.nan, dtype=np.float32)
+    angles[frame_of_record, np.searchsorted(servo_ids, records["servo"])] = records["commanded"]
+    return servo_ids.tolist(), records["t"][new_frame], angles
+
+
+# Function to get the control loop tick each frame is replayed on at rate_hz - the tick nearest its time, or the one after the
+# previous frame's if that is later, so every frame gets a tick of its own and pauses (standing between commands) are kept
+def replay_ticks(times, rate_hz):
+    order = np.arange(len(times))
+    return np.maximum.accumulate(np.round(np.asarray(times, dtype=np.float64) * rate_hz).astype(np.int64) - order) + order
+
+
+# Function to summarize a trace for printing
+def describe_trace(header, records):
+    if not len(records):
+        return "Empty trace"
+    rate_hz = float(header["rate_hz"])
+    duration = float(records["t"][-1])
+    servo_ids = np.unique(records["servo"]).tolist()
+    lines = [f"{len(records)} records, {len(servo_ids)} servos {servo_ids}, {duration:.1f} s at {rate_hz:g} Hz, "
+             f"started {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(float(header['start_time'])))}"]
+    error = np.abs(records["commanded"] - records["physical"])
+    measured = records["temp"] > 0
+    if measured.any():
+        lines.append(f"Tracking error mean {np.nanmean(error):.2f}, max {np.nanmax(error):.2f} degrees, "
+                     f"hottest {records['temp'][measured].max()} C, lowest voltage {records['vin'][measured].min()} mV")
+    return "\n".join(lines)
+
+
+# Function to send the commanded frames of a trace to the servos again - speed 2 plays it twice as fast
+def replay_trace(records, rate_hz, group, speed=1.0):
+    from control_loop import ControlLoop
+
+    servo_ids, times, angles = trace_frames(records)
+    ticks = replay_ticks(times, rate_hz)
+    if list(group.ids) != servo_ids:
+        raise ValueError(f"The servo group is {list(group.ids)}, the trace has servos {servo_ids}")
+    loop = ControlLoop(rate_hz * speed, skip_frames=True)
+    move_time = max(1, int(1000 / (rate_hz * speed)))
+    frames = iter(range(len(ticks)))
+    pending = [next(frames, None)]
+    current = list(angles[0])
+
+    def tick(frame):
+        while pending[0] is not None and ticks[pending[0]] <= frame:
+            for i, angle in enumerate(angles[pending[0]]):
+                if not np.isnan(angle):                         # servos not commanded in a frame keep their last angle
+                    current[i] = float(angle)
+            pending[0] = next(frames, None)
+            if pending[0] is not None and ticks[pending[0]] <= frame:
+                continue                                        # the loop skipped ticks, only send the latest frame
+            group.move_frame(current, move_time)
+        return pending[0] is not None
+
+    loop.run(tick, num_ticks=int(ticks[-1]) + 1)
+    return loop
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+    import tempfile
+
+    parser = argparse.ArgumentParser(description="Inspect, replay or benchmark motion traces")
+    commands = parser.add_subparsers(dest="command", required=True)
+    info = commands.add_parser("info", help="summarize a trace")
+    info.add_argument("trace")
+    replay = commands.add_parser("replay", help="send the commanded angles of a trace to the servos again")
+    replay.add_argument("trace")
+    replay.add_argument("--speed", type=float, default=1.0, help="playback speed, 2 is twice as fast")
+    replay.add_argument("--sim", action="store_true", help="replay on the simulated bus")
+    replay.add_argument("--port", default="/dev/ttyUSB0")
+    bench = commands.add_parser("bench", help="time loading a long synthetic trace")
+    bench.add_argument("--hours", type=float, default=3.0)
+    args = parser.parse_args()
+
+    if args.command == "info":
+        header, records = load_trace(args.trace)
+        print(describe_trace(header, records))
+
+    elif args.command == "replay":
+        from lx16a import LX16A, ServoError
+
+        import sim_bus
+        from bringup import bring_up
+        from servo_group import ServoGroup
+
+        header, records = load_trace(args.trace)
+        servo_ids, _, _ = trace_frames(records)
+        if args.sim:
+            sim_bus.install(servo_ids, timeout=0.1)
+        else:
+            sim_bus.initialize_bus(args.port, 0.1)
+        servos = [LX16A(servo_id) for servo_id in servo_ids]
+        try:
+            bring_up(servos)
+            start = time.perf_counter()
+            loop = replay_trace(records, float(header["rate_hz"]), ServoGroup(servos), args.speed)
+            print(f"Replayed {float(records['t'][-1]):.1f} s of motion in {time.perf_counter() - start:.1f} s")
+            print(loop.report())
+        except ServoError as e:
+            print(f"Replay stopped: {e}")
+
+    elif args.command == "bench":
+        rate_hz = 25
+        num_frames = int(args.hours * 3600 * rate_hz)
+        path = os.path.join(tempfile.mkdtemp(), "motion_trace.bin")
+        header = np.zeros((), dtype=TRACE_HEADER_DTYPE)
+        header["magic"] = TRACE_MAGIC
+        header["record_size"] = TRACE_DTYPE.itemsize
+        header["rate_hz"] = rate_hz
+        header["start_time"] = time.time()
+        records = np.zeros(num_frames * 8, dtype=TRACE_DTYPE)
+        records["frame"] = np.repeat(np.arange(num_frames), 8)
+        records["t"] = records["frame"] / rate_hz
+        records["servo"] = np.tile(np.arange(1, 9), num_frames)
+        records["commanded"] = 120 + 20 * np.sin(2 * np.pi * records["t"])
+        records["physical"] = records["commanded"] + 0.5
+        records["temp"] = 35
+        records["vin"] = 7400
+        with open(path, "wb") as f:
+            f.write(header.tobytes())
+            records.tofile(f)
+        del records
+
+        start = time.perf_counter()
+        header, records = load_trace(path)
+        opened = time.perf_counter() - start
+        start = time.perf_counter()
+        last = records[-8:]["commanded"].mean()
+        print(f"{args.hours:g} h trace, {os.path.getsize(path) / 1e6:.0f} MB: opened in {opened * 1000:.2f} ms, "
+              f"last frame read in {(time.perf_counter() - start) * 1000:.2f} ms (mean angle {last:.1f})")
+        start = time.perf_counter()
+        print(describe_trace(header, records))
+        print(f"Full scan for the summary: {(time.perf_counter() - start) * 1000:.0f} ms")
+
+        # Frames closer together than a tick (a late tick catching up) keep a tick each, a pause keeps its length
+        times = np.array([0.0, 0.04, 0.05, 0.06, 0.30])
+        print(f"Frames at {times.tolist()} s are replayed on ticks {replay_ticks(times, rate_hz).tolist()}")
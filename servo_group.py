@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+
+# Servo group - moves every servo of the robot with one serial write per frame
+# Calling servoN.move(angle, time) for each servo sends 8 separate writes, so the front and back legs start moving before the
+# left and right legs have even received their command. The group encodes all 8 move packets into one pre-allocated buffer
+# and flushes it in a single write, so every joint starts within the time it takes to shift the buffer out on the bus.
+# For exact synchronization, preload_frame sends the moves with wait=True and start() triggers them all with one broadcast packet.
+# Given a BusArbiter, the group hands its packets to the arbiter thread at gait priority instead of writing the port itself.
+# Functions in listeners are called with (ids, values) each time a frame is commanded, e.g. MotionLog.record_frame.
+
+from bus_arbiter import GAIT
+from lx16a import *
+from lx16a_protocol import (BROADCAST_ID, MOVE_PACKET_SIZE, SERVO_MOVE_START, SERVO_MOVE_TIME_WAIT_WRITE, SERVO_MOVE_TIME_WRITE,
+                            bus_lock, encode_packet, write_packet_into)
+
+MOVE_START_PACKET = encode_packet(BROADCAST_ID, SERVO_MOVE_START)     # starts the preloaded move of every servo at once
+
+
+# Function to fill the angle and time fields (and checksums) of a buffer of move packets
+# frame already holds the header, ID, length and command of every packet, values are angles in servo units (0 - 1000)
+def pack_move_frame(frame, values, time):
+    time_low = time & 0xFF
+    time_high = (time >> 8) & 0xFF
+    offset = 0
+    for value in values:
+        angle_low = value & 0xFF
+        angle_high = value >> 8
+        frame[offset + 5] = angle_low
+        frame[offset + 6] = angle_high
+        frame[offset + 7] = time_low
+        frame[offset + 8] = time_high
+        frame[offset + 9] = ~(frame[offset + 2] + frame[offset + 3] + frame[offset + 4] + angle_low + angle_high + time_low + time_high) & 0xFF
+        offset += MOVE_PACKET_SIZE
+
+
+# Function to build an empty frame buffer with one move packet per servo ID
+def new_move_frame(servo_ids, command=SERVO_MOVE_TIME_WRITE):
+    frame = bytearray(MOVE_PACKET_SIZE * len(servo_ids))
+    for i, servo_id in enumerate(servo_ids):
+        write_packet_into(frame, i * MOVE_PACKET_SIZE, servo_id, command, (0, 0, 0, 0))
+    return frame
+
+
+class ServoGroup:
+    # servos  - LX16A objects in the order their angles are given to move_frame (servo1 - servo8 for the robot)
+    # arbiter - BusArbiter that owns the bus, or None to write the port directly
+    def __init__(self, servos, arbiter=None):
+        self.servos = list(servos)
+        self.ids = [servo.get_id() for servo in self.servos]
+        self.arbiter = arbiter
+        self._frame = new_move_frame(self.ids)
+        self._wait_frame = new_move_frame(self.ids, SERVO_MOVE_TIME_WAIT_WRITE)
+        self._values = [0] * len(self.servos)
+        self._waiting_values = [0] * len(self.servos)
+        self._waiting = False
+        self.listeners = []         # called with (ids, angles in servo units) for every frame commanded
+        self.refresh_limits()
+
+    # Function to reload the angle limits of every servo - call this after changing them with set_angle_limits
+    def refresh_limits(self):
+        self._limits = []
+        for servo in self.servos:
+            lower, upper = servo.get_angle_limits()
+            self._limits.append((max(lower, 0), min(upper, 240)))
+
+    # Function to check that every servo can move and convert the angles (degrees) to servo units in values
+    def _to_values(self, angles, values):
+        if len(angles) != len(self.servos):
+            raise ServoArgumentError(f"Expected {len(self.servos)} angles (received {len(angles)})")
+        for servo in self.servos:
+            if not servo.is_torque_enabled():
+                raise ServoLogicalError(f"Servo {servo.get_id()}: torque must be enabled to move", servo.get_id())
+            if servo.is_motor_mode():
+                raise ServoLogicalError(f"Servo {servo.get_id()}: motor mode must be disabled to control movement", servo.get_id())
+
+        for i, angle in enumerate(angles):
+            lower, upper = self._limits[i]
+            if angle < lower or angle > upper:
+                raise ServoArgumentError(f"Servo {self.ids[i]}: angle must be between {lower} and {upper} (received {angle})", self.ids[i])
+            values[i] = round(angle * 25 / 6)
+
+    # Function to send a packet buffer - through the arbiter, a newer buffer with the same key replaces one still queued
+    def _write(self, data, key=None):
+        if self.arbiter is not None:
+            self.arbiter.submit(bytes(data), GAIT, key)
+            return
+        with bus_lock:
+            LX16A._controller.write(data)
+
+    # Function to move every servo to its angle (degrees) over time milliseconds with a single bus write
+    def move_frame(self, angles, time=0):
+        values = self._values
+        self._to_values(angles, values)
+        pack_move_frame(self._frame, values, time)
+        self._write(self._frame, ("move_frame", id(self)))
+
+        for servo, value in zip(self.servos, values):
+            servo._commanded_angle = value      # keep the library's view of the servo in sync, as LX16A.move does
+            servo._waiting_for_move = False
+        self._waiting = False
+        for listener in self.listeners:
+            listener(self.ids, values)
+
+    # Function to load the next frame into every servo without moving - same as LX16A.move(..., wait=True) for each servo
+    def preload_frame(self, angles, time=0):
+        values = self._waiting_values
+        self._to_values(angles, values)
+        pack_move_frame(self._wait_frame, values, time)
+        self._write(self._wait_frame, ("preload_frame", id(self)))
+
+        for servo, value in zip(self.servos, values):
+            servo._waiting_angle = value
+            servo._waiting_for_move = True
+        self._waiting = True
+
+    # Function to start the preloaded frame on every servo at once with a single broadcast move start packet
+    def start(self):
+        if not self._waiting:
+            raise ServoLogicalError("No frame has been preloaded with preload_frame")
+        self._write(MOVE_START_PACKET)
+
+        for servo in self.servos:
+            servo._commanded_angle = servo._waiting_angle
+            servo._waiting_for_move = False
+        self._waiting = False
+        for listener in self.listeners:
+            listener(self.ids, self._waiting_values)
+
+
+# Benchmark - frames per second for 8 separate move writes versus one batched write, against a fake servo bus on a pseudo-terminal
+if __name__ == "__main__":
+    import os
+    import pty
+    import threading
+    import time as clock
+
+    import serial
+
+    from lx16a_protocol import to_bytes
+
+    master, slave = pty.openpty()
+    tty_name = os.ttyname(slave)
+    bus_bytes = [0]
+
+    def drain_bus():                                    # the fake bus just swallows everything that is written to it
+        while True:
+            try:
+                bus_bytes[0] += len(os.read(master, 65536))
+            except OSError:
+                return
+
+    threading.Thread(target=drain_bus, daemon=True).start()
+    port = serial.Serial(tty_name, baudrate=115200, timeout=0.1, write_timeout=0.1)
+
+    servo_ids = list(range(1, 9))
+    num_frames = 5000
+    angles = [147.36, 88.80, 133.68, 153.84, 115.44, 172.80, 130.56, 121.20]
+
+    start = clock.perf_counter()
+    for _ in range(num_frames):
+        for servo_id, angle in zip(servo_ids, angles):          # what calling servoN.move(angle, 40) for each servo does
+            port.write(encode_packet(servo_id, SERVO_MOVE_TIME_WRITE, (*to_bytes(round(angle * 25 / 6)), *to_bytes(40))))
+    sequential = num_frames / (clock.perf_counter() - start)
+
+    frame = new_move_frame(servo_ids)
+    start = clock.perf_counter()
+    for _ in range(num_frames):
+        pack_move_frame(frame, [round(angle * 25 / 6) for angle in angles], 40)
+        port.write(frame)
+    batched = num_frames / (clock.perf_counter() - start)
+
+    print(f"8 writes per frame: {sequential:9.0f} frames/s")
+    print(f"1 write per frame:  {batched:9.0f} frames/s ({batched / sequential:.1f}x)")
@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+
+# Simulated LX-16A servo bus - lets the scripts and benchmarks run without the robot attached
+# SimulatedServoBus speaks the LX-16A packet protocol and models each servo (angle, move time, limits, temperature, voltage).
+# It can be reached in-process (SimulatedPort, a stand-in for the serial.Serial object LX16A.initialize creates) or through a
+# pseudo-terminal (PtyBus) so the real pyserial code path is exercised. Transfer time is simulated per byte and read timeouts
+# and bad checksums can be injected at a configurable rate.
+#
+# Usage:
+#   from sim_bus import initialize_bus
+#   initialize_bus("/dev/ttyUSB0", 0.1)     # real port, or the simulated bus when the LX16A_SIM environment variable is set
+
+import os
+import random
+import threading
+import time
+
+from lx16a import LX16A
+from lx16a_protocol import *
+
+BAUDRATE = 115200
+BYTE_TIME = 10 / BAUDRATE           # seconds to shift one byte out on the bus (8 data bits + start + stop)
+ROBOT_SERVO_IDS = range(1, 9)
+
+AMBIENT_TEMP = 28.0                 # degrees Celsius
+HEATING_RATE = 0.5                  # degrees per second while a servo is moving
+COOLING_RATE = 0.05                 # fraction of the distance to ambient lost per second
+SUPPLY_VOLTAGE = 7400               # millivolts
+VOLTAGE_SAG = 40                    # millivolts lost per servo that is moving
+
+
+# State of one simulated servo - angles are kept in servo units (0 - 1000) like the real servo
+class SimulatedServo:
+    def __init__(self, servo_id, angle=500, clock=time.monotonic):
+        self.id = servo_id
+        self.clock = clock
+        self.start_angle = angle
+        self.target_angle = angle
+        self.move_started = clock()
+        self.move_time = 0                  # milliseconds
+        self.waiting_angle = None
+        self.waiting_time = 0
+        self.angle_offset = 0
+        self.angle_limits = (0, 1000)
+        self.vin_limits = (4500, 12000)
+        self.temp_limit = 85
+        self.motor_mode = False
+        self.motor_speed = 0
+        self.torque_enabled = False
+        self.led_on = True
+        self.led_error_triggers = 0
+        self.temperature = AMBIENT_TEMP
+        self.vin = SUPPLY_VOLTAGE
+        self._last_update = clock()
+
+    # Function to get the angle the servo is at right now - moves are linear over their move time
+    def physical_angle(self):
+        if self.move_time <= 0:
+            return self.target_angle
+        progress = (self.clock() - self.move_started) * 1000 / self.move_time
+        if progress >= 1:
+            return self.target_angle
+        return self.start_angle + (self.target_angle - self.start_angle) * progress
+
+    def is_moving(self):
+        return self.physical_angle() != self.target_angle
+
+    # Function to start a move from wherever the servo currently is
+    def move(self, angle, move_time):
+        if not self.torque_enabled or self.motor_mode:
+            return
+        lower, upper = self.angle_limits
+        self.start_angle = self.physical_angle()
+        self.target_angle = min(max(angle, lower), upper)
+        self.move_time = move_time
+        self.move_started = self.clock()
+
+    def stop(self):
+        self.target_angle = self.start_angle = self.physical_angle()
+        self.move_time = 0
+
+    # Function to advance the temperature model to now
+    def update_thermal(self):
+        now = self.clock()
+        elapsed = now - self._last_update
+        self._last_update = now
+        if self.is_moving():
+            self.temperature += HEATING_RATE * elapsed
+        self.temperature -= (self.temperature - AMBIENT_TEMP) * min(COOLING_RATE * elapsed, 1)
+
+
+class SimulatedServoBus:
+    # servo_ids          - IDs of the servos on the bus
+    # timeout_rate       - chance that a servo does not answer a read command
+    # checksum_error_rate - chance that an answer has a corrupted checksum
+    def __init__(self, servo_ids=ROBOT_SERVO_IDS, timeout_rate=0.0, checksum_error_rate=0.0, seed=None, clock=time.monotonic):
+        self.clock = clock
+        self.servos = {servo_id: SimulatedServo(servo_id, clock=clock) for servo_id in servo_ids}
+        self.timeout_rate = timeout_rate
+        self.checksum_error_rate = checksum_error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self._pending = bytearray()
+        self.packets = 0                    # packets received
+        self.bytes_written = 0              # bytes received from the host
+        self.bytes_read = 0                 # bytes answered back to the host
+        self.bad_packets = 0                # packets dropped because of a bad checksum or length
+
+    # Function to feed bytes written by the host into the bus - returns the bytes the servos answer with
+    def process(self, data):
+        with self.lock:
+            self.bytes_written += len(data)
+            self._pending += data
+            response = bytearray()
+            while True:
+                start = self._pending.find(bytes((HEADER, HEADER)))
+                if start < 0 or len(self._pending) < start + 4:
+                    break                                   # wait for the rest of the packet
+                size = self._pending[start + 3] + 3
+                if size < 6:
+                    self.bad_packets += 1
+                    del self._pending[:start + 2]
+                    continue
+                if len(self._pending) < start + size:
+                    break
+                packet = bytes(self._pending[start:start + size])
+                del self._pending[:start + size]
+                if checksum(packet, 0, size - 1) != packet[-1]:
+                    self.bad_packets += 1
+                    continue
+                self.packets += 1
+                response += self._handle(packet[2], packet[4], packet[5:-1])
+            self.bytes_read += len(response)
+            return bytes(response)
+
+    # Function to run one command - returns the answer packet (empty for write commands and broadcasts)
+    def _handle(self, servo_id, command, params):
+        if servo_id == BROADCAST_ID:
+            for servo in self.servos.values():
+                self._write_command(servo, command, params)
+            return b""
+        servo = self.servos.get(servo_id)
+        if servo is None:
+            return b""
+        answer = self._read_command(servo, command)
+        if answer is None:
+            self._write_command(servo, command, params)
+            return b""
+        if self.random.random() < self.timeout_rate:
+            return b""
+        packet = bytearray(encode_packet(servo.id, command, answer))
+        if self.random.random() < self.checksum_error_rate:
+            packet[-1] ^= 0xFF
+        return bytes(packet)
+
+    # Function to apply a write command to a servo
+    def _write_command(self, servo, command, params):
+        def word(i):
+            return params[i] + params[i + 1] * 256
+
+        if command == SERVO_MOVE_TIME_WRITE:
+            servo.move(word(0), word(2))
+        elif command == SERVO_MOVE_TIME_WAIT_WRITE:
+            servo.waiting_angle, servo.waiting_time = word(0), word(2)
+        elif command == SERVO_MOVE_START:
+            if servo.waiting_angle is not None:
+                servo.move(servo.waiting_angle, servo.waiting_time)
+                servo.waiting_angle = None
+        elif command == SERVO_MOVE_STOP:
+            servo.stop()
+        elif command == 13:                                 # ID write
+            self.servos.pop(servo.id, None)
+            servo.id = params[0]
+            self.servos[servo.id] = servo
+        elif command == 17:                                 # angle offset adjust (signed byte)
+            servo.angle_offset = params[0] - 256 if params[0] > 127 else params[0]
+        elif command == SERVO_ANGLE_LIMIT_WRITE:
+            servo.angle_limits = (word(0), word(2))
+        elif command == SERVO_VIN_LIMIT_WRITE:
+            servo.vin_limits = (word(0), word(2))
+        elif command == SERVO_TEMP_MAX_LIMIT_WRITE:
+            servo.temp_limit = params[0]
+        elif command == SERVO_OR_MOTOR_MODE_WRITE:
+            servo.motor_mode = params[0] == 1
+            servo.motor_speed = word(2)
+        elif command == SERVO_LOAD_OR_UNLOAD_WRITE:
+            servo.torque_enabled = params[0] == 1
+        elif command == SERVO_LED_CTRL_WRITE:
+            servo.led_on = params[0] == 0
+        elif command == SERVO_LED_ERROR_WRITE:
+            servo.led_error_triggers = params[0]
+
+    # Function to answer a read command - returns the answer parameters, or None if command is not a read
+    def _read_command(self, servo, command):
+        if command == SERVO_POS_READ:
+            angle = round(servo.physical_angle())
+            return to_bytes(angle + 65536 if angle < 0 else angle)
+        if command == SERVO_TEMP_READ:
+            servo.update_thermal()
+            return (int(servo.temperature),)
+        if command == SERVO_VIN_READ:
+            moving = sum(other.is_moving() for other in self.servos.values())
+            return to_bytes(servo.vin - VOLTAGE_SAG * moving)
+        if command == SERVO_MOVE_TIME_READ:
+            return (*to_bytes(servo.target_angle), *to_bytes(servo.move_time))
+        if command == SERVO_MOVE_TIME_WAIT_READ:
+            return (*to_bytes(servo.waiting_angle or 0), *to_bytes(servo.waiting_time))
+        if command == SERVO_ID_READ:
+            return (servo.id,)
+        if command == SERVO_ANGLE_OFFSET_READ:
+            return (servo.angle_offset & 0xFF,)
+        if command == SERVO_ANGLE_LIMIT_READ:
+            return (*to_bytes(servo.angle_limits[0]), *to_bytes(servo.angle_limits[1]))
+        if command == SERVO_VIN_LIMIT_READ:
+            return (*to_bytes(servo.vin_limits[0]), *to_bytes(servo.vin_limits[1]))
+        if command == SERVO_TEMP_MAX_LIMIT_READ:
+            return (servo.temp_limit,)
+        if command == SERVO_OR_MOTOR_MODE_READ:
+            return (int(servo.motor_mode), 0, *to_bytes(servo.motor_speed))
+        if command == SERVO_LOAD_OR_UNLOAD_READ:
+            return (int(servo.torque_enabled),)
+        if command == SERVO_LED_CTRL_READ:
+            return (0 if servo.led_on else 1,)
+        if command == SERVO_LED_ERROR_READ:
+            return (servo.led_error_triggers,)
+        return None
+
+
+# In-process stand-in for the serial.Serial object that LX16A.initialize creates
+# byte_time - simulated transfer time per byte, 0 runs the bus as fast as Python allows
+class SimulatedPort:
+    def __init__(self, bus, timeout=0.02, byte_time=BYTE_TIME):
+        self.bus = bus
+        self.timeout = timeout
+        self.write_timeout = timeout
+        self.byte_time = byte_time
+        self._received = bytearray()
+
+    @property
+    def in_waiting(self):
+        return len(self._received)
+
+    def write(self, data):
+        if self.byte_time:
+            time.sleep(len(data) * self.byte_time)
+        self._received += self.bus.process(bytes(data))
+        return len(data)
+
+    def read(self, size=1):
+        data = bytes(self._received[:size])
+        del self._received[:size]
+        if self.byte_time:
+            time.sleep(len(data) * self.byte_time)
+        if len(data) < size and self.timeout:
+            time.sleep(self.timeout)        # a real port blocks until the timeout when the servo does not answer
+        return data
+
+    def reset_input_buffer(self):
+        self._received.clear()
+
+    flushInput = reset_input_buffer
+
+    def reset_output_buffer(self):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+# Simulated bus behind a pseudo-terminal - port is a device path that can be passed to LX16A.initialize
+# Bytes are taken off the pty a few at a time and each chunk takes its time on the bus, so a writer that gets ahead of the bus
+# is held back by the pty filling up, like a real serial port, instead of by one long pause for everything queued at once.
+class PtyBus:
+    chunk_size = 64                 # bytes taken off the pty at a time, about 5.6 ms at 115200 baud
+
+    def __init__(self, bus, byte_time=BYTE_TIME):
+        import pty
+        self.bus = bus
+        self.byte_time = byte_time
+        import termios
+        import tty
+        self._master, self._slave = pty.openpty()
+        tty.setraw(self._slave, termios.TCSANOW)
+        self.port = os.ttyname(self._slave)
+        self._lock = threading.Lock()
+        self._busy = False                  # a chunk has been taken off the pty and is still on the bus
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def _serve(self):
+        import select
+        while True:
+            try:
+                select.select([self._master], [], [])
+                with self._lock:
+                    data = os.read(self._master, self.chunk_size)
+                    self._busy = True
+            except (OSError, ValueError):
+                return
+            if self.byte_time:
+                time.sleep(len(data) * self.byte_time)      # every command takes its time on the bus, answered or not
+            response = self.bus.process(data)
+            if response:
+                if self.byte_time:
+                    time.sleep(len(response) * self.byte_time)
+                os.write(self._master, response)
+            with self._lock:
+                self._busy = False
+
+    # Function to wait until everything written to the port has gone over the bus - pyserial's flush() returns as soon as the
+    # bytes are in the pty
+    def drain(self):
+        import fcntl
+        import struct
+        import termios
+        while True:
+            with self._lock:
+                waiting = struct.unpack("i", fcntl.ioctl(self._master, termios.FIONREAD, b"\0\0\0\0"))[0]
+                if not waiting and not self._busy:
+                    return
+            time.sleep(self.byte_time * self.chunk_size or 0.001)
+
+    def close(self):
+        os.close(self._master)
+        os.close(self._slave)
+
+
+# Function to point the lx16a library at a simulated bus - returns the SimulatedServoBus so its state can be inspected
+def install(servo_ids=ROBOT_SERVO_IDS, timeout=0.02, byte_time=BYTE_TIME, **bus_options):
+    bus = SimulatedServoBus(servo_ids, **bus_options)
+    LX16A._controller = SimulatedPort(bus, timeout, byte_time)
+    return bus
+
+
+# Function used by the scripts in place of LX16A.initialize - uses the simulated bus when LX16A_SIM is set in the environment
+def initialize_bus(port, timeout=0.02):
+    if os.environ.get("LX16A_SIM"):
+        print("LX16A_SIM is set - using the simulated servo bus.")
+        return install(timeout=timeout)
+    LX16A.initialize(port, timeout)
+    return None
+
+
+# Benchmark - frames per second of the different ways of moving 8 servos, over the pty bus with real serial timing
+if __name__ == "__main__":
+    from servo_group import ServoGroup
+
+    angles = [147.36, 88.80, 133.68, 153.84, 115.44, 172.80, 130.56, 121.20]
+    num_frames = 200
+
+    pty_bus = PtyBus(SimulatedServoBus())
+    LX16A.initialize(pty_bus.port, 0.1)
+    LX16A._controller.write_timeout = 2.0      # frames are sent faster than the bus carries them, writes wait for the pty to empty
+    servos = [LX16A(servo_id) for servo_id in ROBOT_SERVO_IDS]
+    group = ServoGroup(servos)
+
+    def bench(name, send_frame):
+        start = time.perf_counter()
+        for _ in range(num_frames):
+            send_frame()
+        pty_bus.drain()
+        print(f"{name:<28} {num_frames / (time.perf_counter() - start):8.0f} frames/s")
+
+    def sequential_moves():
+        for servo, angle in zip(servos, angles):
+            servo.move(angle, 40)
+
+    def synchronized_frame():
+        group.preload_frame(angles, 40)
+        group.start()
+
+    bench("servoN.move() x 8", sequential_moves)
+    bench("ServoGroup.move_frame()", lambda: group.move_frame(angles, 40))
+    bench("preload_frame() + start()", synchronized_frame)
+
+    start = time.perf_counter()
+    for servo in servos:
+        servo.get_physical_angle()
+    print(f"8 angle reads                {(time.perf_counter() - start) * 1000:8.2f} ms")
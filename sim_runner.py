@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+
+# Headless simulation runner - PyBullet in DIRECT mode, stepping as fast as the physics allows
+# simulation(windows).py opens the GUI and sleeps 1/240 s after every step, so 10,000 steps take at least 42 s whatever the
+# machine. The runner connects without a GUI (its own physics client, so several can run side by side), loads the plane and
+# the robot once, saves that state, and restores it at the start of every episode instead of reloading the URDF. Steps are
+# only slowed down when a real-time factor is given, e.g. 1.0 to watch with gui=True at normal speed.
+#
+# Usage: sim_runner.py [--urdf myrobot.urdf] [--episodes 20] [--seconds 5] [--real-time 1.0] [--gui]
+
+import math
+import time
+from collections import namedtuple
+
+import pybullet as p
+import pybullet_data
+
+ROBOT_URDF = "myrobot.urdf"                 # the robot model simulation(windows).py loads
+STAND_IN_URDF = "quadruped/minitaur.urdf"   # 8 motor quadruped from pybullet_data, used when the robot model is not found
+STAND_IN_JOINTS = ("motor_front_leftL_joint", "motor_front_leftR_joint", "motor_back_leftL_joint", "motor_back_leftR_joint",
+                   "motor_front_rightL_joint", "motor_front_rightR_joint", "motor_back_rightL_joint", "motor_back_rightR_joint")
+TIME_STEP = 1 / 240                         # PyBullet's default step
+NUM_SERVOS = 8
+
+# Where an episode left the robot - positions in metres, orientation as roll, pitch, yaw in radians
+EpisodeResult = namedtuple("EpisodeResult", ["start_position", "end_position", "end_orientation", "steps", "sim_time", "wall_time"])
+
+
+class SimRunner:
+    # urdf             - robot model, looked up in the working directory and pybullet_data
+    # joint_names      - joints driven by servo1 - servo8 in order, default the first 8 revolute joints of the model
+    # real_time_factor - None to step as fast as possible, 1.0 for real time, 0.5 for half speed...
+    def __init__(self, urdf=ROBOT_URDF, joint_names=None, start_position=(0, 0, 1), start_orientation=(0, 0, 0), gui=False,
+                 real_time_factor=None, time_step=TIME_STEP, force=2.0):
+        self.client = p.connect(p.GUI if gui else p.DIRECT)
+        self.real_time_factor = real_time_factor
+        self.time_step = time_step
+        self.force = force                                          # N*m, about what an LX-16A holds (17 kg*cm)
+        p.setAdditionalSearchPath(pybullet_data.getDataPath(), physicsClientId=self.client)
+        p.setGravity(0, 0, -9.81, physicsClientId=self.client)
+        p.setTimeStep(time_step, physicsClientId=self.client)
+        self.ground = p.loadURDF("plane.urdf", physicsClientId=self.client)
+        self.robot = p.loadURDF(urdf, start_position, p.getQuaternionFromEuler(start_orientation), physicsClientId=self.client)
+
+        joints = {}
+        for j in range(p.getNumJoints(self.robot, physicsClientId=self.client)):
+            info = p.getJointInfo(self.robot, j, physicsClientId=self.client)
+            if info[2] == p.JOINT_REVOLUTE:
+                joints[info[1].decode()] = j
+        if joint_names is None:
+            self.joints = list(joints.values())[:NUM_SERVOS]
+        else:
+            missing = [name for name in joint_names if name not in joints]
+            if missing:
+                raise ValueError(f"{urdf} has no revolute joints named {missing}")
+            self.joints = [joints[name] for name in joint_names]
+
+        self._initial_state = p.saveState(physicsClientId=self.client)
+        self.total_steps = 0
+        self.total_wall_time = 0.0
+
+    def close(self):
+        p.disconnect(self.client)
+
+    # Function to put the robot back where it was loaded, standing still
+    def reset(self):
+        p.restoreState(self._initial_state, physicsClientId=self.client)
+
+    # Function to set the joint targets - angles in radians, relative to the pose the model was loaded in
+    def set_targets(self, angles):
+        p.setJointMotorControlArray(self.robot, self.joints, p.POSITION_CONTROL, targetPositions=angles,
+                                    forces=[self.force] * len(self.joints), physicsClientId=self.client)
+
+    # Function to get the base position and orientation (roll, pitch, yaw)
+    def base_pose(self):
+        position, orientation = p.getBasePositionAndOrientation(self.robot, physicsClientId=self.client)
+        return position, p.getEulerFromQuaternion(orientation)
+
+    # Function to get the joint angles (radians) and the mechanical power of the motors right now (W)
+    def joint_state(self):
+        states = p.getJointStates(self.robot, self.joints, physicsClientId=self.client)
+        return [state[0] for state in states], sum(abs(state[1] * state[3]) for state in states)
+
+    # Function to step the physics
+    def step(self, num_steps=1):
+        for _ in range(num_steps):
+            p.stepSimulation(physicsClientId=self.client)
+        self.total_steps += num_steps
+
+    # Function to run one episode from the saved start state - controller(frame) is called control_rate times per simulated second
+    # and returns joint targets in radians (or None to keep the last ones), on_step(runner) after every control frame
+    def run_episode(self, controller, duration, control_rate=25, on_step=None):
+        self.reset()
+        start_position, _ = self.base_pose()
+        steps_per_frame = 1 / (control_rate * self.time_step)      # not always whole, e.g. 9.6 at 25 Hz
+        num_frames = int(duration * control_rate)
+        steps = 0
+        wall_start = time.perf_counter()
+        for frame in range(num_frames):
+            targets = controller(frame)
+            if targets is not None:
+                self.set_targets(targets)
+            frame_steps = round((frame + 1) * steps_per_frame) - steps
+            self.step(frame_steps)
+            steps += frame_steps
+            if on_step is not None:
+                on_step(self)
+            if self.real_time_factor:
+                ahead = steps * self.time_step / self.real_time_factor - (time.perf_counter() - wall_start)
+                if ahead > 0:
+                    time.sleep(ahead)
+        wall_time = time.perf_counter() - wall_start
+        self.total_wall_time += wall_time
+        end_position, end_orientation = self.base_pose()
+        return EpisodeResult(start_position, end_position, end_orientation, steps, steps * self.time_step, wall_time)
+
+    # Function to get the simulation speed over every episode so far
+    def steps_per_second(self):
+        return self.total_steps / self.total_wall_time if self.total_wall_time else 0.0
+
+
+# Function to turn a gait table (servo angles in degrees) into a controller - angles relative to the home pose, in radians
+def table_controller(table, home_angles):
+    offsets = [[math.radians(angle - home) for angle, home in zip(frame, home_angles)] for frame in table]
+    return lambda frame: offsets[frame % len(offsets)]
+
+
+# Benchmark - run the forward gait for several episodes and report simulated steps per second
+if __name__ == "__main__":
+    import argparse
+    import os
+
+    from gait_table import compile_gait_table
+
+    parser = argparse.ArgumentParser(description="Run the forward gait in a headless PyBullet simulation")
+    parser.add_argument("--urdf", default=ROBOT_URDF)
+    parser.add_argument("--episodes", type=int, default=20)
+    parser.add_argument("--seconds", type=float, default=5.0, help="simulated seconds per episode")
+    parser.add_argument("--real-time", type=float, default=None, help="real-time factor, default as fast as possible")
+    parser.add_argument("--gui", action="store_true")
+    args = parser.parse_args()
+
+    urdf, joint_names = args.urdf, None
+    if not os.path.exists(urdf) and not os.path.exists(os.path.join(pybullet_data.getDataPath(), urdf)):
+        print(f"{urdf} not found, using the {STAND_IN_URDF} model from pybullet_data instead")
+        urdf, joint_names = STAND_IN_URDF, STAND_IN_JOINTS
+
+    home_angles = [147.36, 88.80, 133.68, 153.84, 115.44, 172.80, 130.56, 121.20]
+    table = compile_gait_table(home_angles, [20] * 8, [math.pi, math.pi, math.pi, 0, math.pi, math.pi, math.pi, 0], 1.0, 25)
+    controller = table_controller(table.tolist(), home_angles)
+
+    start = time.perf_counter()
+    runner = SimRunner(urdf, joint_names, start_position=(0, 0, 0.3), gui=args.gui, real_time_factor=args.real_time)
+    print(f"Loaded in {(time.perf_counter() - start) * 1000:.0f} ms")
+    for episode in range(args.episodes):
+        result = runner.run_episode(controller, args.seconds)
+        distance = math.hypot(result.end_position[0] - result.start_position[0], result.end_position[1] - result.start_position[1])
+        if episode == 0:
+            print(f"Episode moved {distance:.3f} m in {result.sim_time:.1f} s simulated, {result.wall_time:.2f} s wall time")
+    runner.close()
+
+    rate = runner.steps_per_second()
+    print(f"{args.episodes} episodes, {runner.total_steps} steps: {rate:.0f} steps/s, {rate * TIME_STEP:.1f}x real time "
+          f"(the GUI script's sleep caps it at {1 / TIME_STEP:.0f} steps/s)")
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+
+# Sound bank - Minion clips decoded once into pygame.mixer.Sound buffers and played from RAM
+# play_audio used to call pygame.mixer.music.load for every command, which opens and decodes the file on the SD card each time and
+# can only play one clip at once (a whistle during forward_motion cut off whatever was playing). The bank keeps the decoded
+# clips in memory, least recently used first out once they go over max_bytes, and plays them on mixer channels reserved for the
+# bank so a response and the gait's whistle can overlap.
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import pygame
+
+SOUND_EXTENSIONS = (".wav", ".ogg")
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024        # decoded audio kept in memory, about 6 minutes of 44.1 kHz 16 bit stereo
+DEFAULT_NUM_CHANNELS = 4
+
+
+class SoundBank:
+    # max_bytes    - decoded audio kept in memory before the least recently played clips are dropped
+    # num_channels - mixer channels reserved for the bank, the most sounds that can play at the same time
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, num_channels=DEFAULT_NUM_CHANNELS):
+        if not pygame.mixer.get_init():
+            pygame.mixer.init()
+        frequency, sample_format, channels = pygame.mixer.get_init()
+        self._bytes_per_second = frequency * channels * abs(sample_format) // 8
+        self.max_bytes = max_bytes
+        self.num_bytes = 0
+        self._sounds = OrderedDict()                # path -> (Sound, size in bytes), least recently played first
+        self._lock = threading.Lock()
+
+        if pygame.mixer.get_num_channels() < num_channels:
+            pygame.mixer.set_num_channels(num_channels)
+        pygame.mixer.set_reserved(num_channels)     # pygame's own automatic channel picking leaves these alone
+        self.channels = [pygame.mixer.Channel(i) for i in range(num_channels)]
+        self._next_channel = 0
+        self._started = [0.0] * num_channels       # monotonic time each channel last started a clip
+
+    # Function to decode the given clips now so the first play does not wait for the SD card
+    def preload(self, paths):
+        for path in paths:
+            try:
+                self.get(path)
+            except (pygame.error, FileNotFoundError) as e:
+                print(f"Could not load {path}: {e}")
+
+    # Function to decode every clip in a directory (and its subdirectories)
+    def preload_dir(self, sound_dir):
+        paths = []
+        for root, _, file_names in os.walk(sound_dir):
+            paths.extend(os.path.join(root, name) for name in sorted(file_names) if name.lower().endswith(SOUND_EXTENSIONS))
+        self.preload(paths)
+
+    # Function to get the decoded clip of a file, loading it on first use
+    def get(self, path):
+        with self._lock:
+            entry = self._sounds.get(path)
+            if entry is not None:
+                self._sounds.move_to_end(path)
+                return entry[0]
+
+        sound = pygame.mixer.Sound(path)            # decoded outside the lock so other clips can still play meanwhile
+        size = int(sound.get_length() * self._bytes_per_second)
+        with self._lock:
+            if path not in self._sounds:
+                self._sounds[path] = (sound, size)
+                self.num_bytes += size
+            while self.num_bytes > self.max_bytes and len(self._sounds) > 1:
+                _, (_, dropped) = self._sounds.popitem(last=False)
+                self.num_bytes -= dropped
+        return sound
+
+    # Function to play a clip - on the given channel (index into channels), or on a free one if there is one,
+    # otherwise the channel that started playing longest ago. Returns the pygame Channel
+    def play(self, path, channel=None):
+        sound = self.get(path)
+        with self._lock:
+            if channel is None:
+                for _ in range(len(self.channels)):
+                    channel = self._next_channel
+                    self._next_channel = (channel + 1) % len(self.channels)
+                    if not self.channels[channel].get_busy():
+                        break
+                else:
+                    channel = min(range(len(self.channels)), key=self._started.__getitem__)
+            self._started[channel] = time.monotonic()
+        self.channels[channel].play(sound)
+        return self.channels[channel]
+
+    # Function to stop every sound the bank is playing
+    def stop(self):
+        for channel in self.channels:
+            channel.stop()
+
+
+# Benchmark - time from the play call until the mixer is playing, loading from disk every time versus playing from the bank
+if __name__ == "__main__":
+    import math
+    import struct
+    import tempfile
+    import time
+    import wave
+
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")       # no sound card needed
+    pygame.mixer.init(frequency=44100, size=-16, channels=2)
+
+    sound_dir = tempfile.mkdtemp()
+    paths = []
+    for i in range(8):                                      # 8 clips of 2 seconds each, like the Minion noises
+        path = os.path.join(sound_dir, f"clip {i}.wav")
+        with wave.open(path, "wb") as f:
+            f.setnchannels(2)
+            f.setsampwidth(2)
+            f.setframerate(44100)
+            samples = (int(8000 * math.sin(2 * math.pi * (220 + 40 * i) * n / 44100)) for n in range(2 * 44100))
+            f.writeframes(b"".join(struct.pack("<hh", sample, sample) for sample in samples))
+        paths.append(path)
+
+    repeats = 5
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for path in paths:
+            pygame.mixer.music.load(path)                   # what play_audio used to do
+            pygame.mixer.music.play()
+    from_disk = (time.perf_counter() - start) / (repeats * len(paths))
+    pygame.mixer.music.stop()
+
+    bank = SoundBank()
+    start = time.perf_counter()
+    bank.preload_dir(sound_dir)
+    preload = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for path in paths:
+            bank.play(path)
+    from_bank = (time.perf_counter() - start) / (repeats * len(paths))
+    bank.stop()
+
+    # With every channel busy the next clip replaces the one that started longest ago, not the one that just began
+    played = [bank.channels.index(bank.play(path)) for path in paths[:len(bank.channels) + 1]]
+    bank.stop()
+
+    print(f"Preloaded {len(paths)} clips ({bank.num_bytes / 1e6:.1f} MB) in {preload * 1000:.1f} ms")
+    print(f"mixer.music.load + play: {from_disk * 1000:7.3f} ms per sound")
+    print(f"SoundBank.play:          {from_bank * 1000:7.3f} ms per sound")
+    print(f"Channels used for {len(played)} clips in a row: {played} (the last one reuses channel {played[0]}, the oldest)")
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+
+# Speech recognition backends - turn one utterance of 16 bit mono PCM audio into text
+# recognize_google sends every utterance over the network, which costs hundreds of milliseconds to seconds per command and fails
+# without a connection. VoskBackend runs offline on the Pi and only listens for the keywords the command dispatcher knows
+# (anything else comes out as "[unk]"), which is both faster and more accurate than open dictation. GoogleBackend keeps the old
+# behaviour behind the same interface. Each engine is imported when its backend is created, so neither one is required.
+#
+# Vosk model: download vosk-model-small-en-us-0.15 from https://alphacephei.com/vosk/models and unzip it next to this script
+
+import json
+import os
+
+SAMPLE_RATE = 16000                                     # Hz, what the Vosk small models are trained on
+VOSK_MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "vosk-model-small-en-us-0.15")
+
+
+# Raised when a backend cannot produce a result at all, e.g. no network connection for Google
+class RecognitionError(Exception):
+    pass
+
+
+# Interface of a backend - transcribe returns the text heard, or None if nothing was understood
+class SpeechBackend:
+    name = "none"
+
+    def transcribe(self, pcm, sample_rate=SAMPLE_RATE):
+        raise NotImplementedError
+
+
+class GoogleBackend(SpeechBackend):
+    name = "google"
+
+    def __init__(self):
+        import speech_recognition as sr
+        self._sr = sr
+        self._recognizer = sr.Recognizer()
+
+    def transcribe(self, pcm, sample_rate=SAMPLE_RATE):
+        try:
+            return self._recognizer.recognize_google(self._sr.AudioData(pcm, sample_rate, 2))
+        except self._sr.UnknownValueError:
+            return None
+        except self._sr.RequestError as e:
+            raise RecognitionError(f"Could not request results from Google: {e}") from e
+
+
+class VoskBackend(SpeechBackend):
+    name = "vosk"
+
+    # vocabulary - phrases to listen for, e.g. CommandDispatcher.keywords(); None for open dictation
+    def __init__(self, vocabulary=None, model_path=VOSK_MODEL_PATH):
+        import vosk
+        vosk.SetLogLevel(-1)
+        if not os.path.isdir(model_path):
+            raise RecognitionError(f"No Vosk model at {model_path}")
+        self._vosk = vosk
+        self._model = vosk.Model(model_path)
+        self._grammar = None
+        if vocabulary is not None:
+            self._grammar = json.dumps(sorted({phrase.lower() for phrase in vocabulary}) + ["[unk]"])
+        self._recognizers = {}                          # sample rate -> KaldiRecognizer, reused between utterances
+
+    def transcribe(self, pcm, sample_rate=SAMPLE_RATE):
+        recognizer = self._recognizers.get(sample_rate)
+        if recognizer is None:
+            if self._grammar is None:
+                recognizer = self._vosk.KaldiRecognizer(self._model, sample_rate)
+            else:
+                recognizer = self._vosk.KaldiRecognizer(self._model, sample_rate, self._grammar)
+            self._recognizers[sample_rate] = recognizer
+        else:
+            recognizer.Reset()
+        recognizer.AcceptWaveform(pcm)
+        text = json.loads(recognizer.FinalResult()).get("text", "")
+        text = " ".join(word for word in text.split() if word != "[unk]")
+        return text or None
+
+
+# Function to create a backend by name - "vosk", "google", or "auto" for Vosk if it is installed with a model, else Google
+def make_backend(name="auto", vocabulary=None, model_path=VOSK_MODEL_PATH):
+    if name == "vosk":
+        return VoskBackend(vocabulary, model_path)
+    if name == "google":
+        return GoogleBackend()
+    if name != "auto":
+        raise ValueError(f"Unknown speech backend {name!r}")
+    try:
+        return VoskBackend(vocabulary, model_path)
+    except (ImportError, RecognitionError) as e:
+        print(f"Offline speech recognition unavailable ({e}), using Google.")
+        return GoogleBackend()
+
+
+# Function to read a wav file as 16 bit mono PCM - returns (pcm bytes, sample rate)
+def read_wav(path):
+    import wave
+
+    import numpy as np
+
+    with wave.open(path, "rb") as f:
+        if f.getsampwidth() != 2:
+            raise ValueError(f"{path}: expected 16 bit samples (got {8 * f.getsampwidth()} bit)")
+        samples = np.frombuffer(f.readframes(f.getnframes()), dtype="<i2")
+        channels = f.getnchannels()
+        sample_rate = f.getframerate()
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1).astype("<i2")
+    return samples.tobytes(), sample_rate
+
+
+# Benchmark - replay recorded commands through a backend and report latency and keyword accuracy
+# Usage: speech_backends.py [vosk|google|auto] recording.wav ...
+# The keyword a recording should trigger is taken from its file name, e.g. "walk forward 1.wav" or "what_are_you_doing.wav"
+if __name__ == "__main__":
+    import sys
+    import time
+
+    from command_dispatcher import BACKWARD_KEYWORDS, FORWARD_KEYWORDS, SOUND_COMMANDS, STOP_KEYWORDS, CommandDispatcher
+
+    args = sys.argv[1:]
+    backend_name = args.pop(0) if args and args[0] in ("vosk", "google", "auto") else "auto"
+    if not args:
+        print("Usage: speech_backends.py [vosk|google|auto] recording.wav ...")
+        sys.exit(1)
+
+    dispatcher = CommandDispatcher()
+    dispatcher.register(FORWARD_KEYWORDS, lambda: None)
+    dispatcher.register(BACKWARD_KEYWORDS, lambda: None)
+    dispatcher.register(STOP_KEYWORDS, lambda: None)
+    for _, keywords in SOUND_COMMANDS:
+        dispatcher.register(keywords, lambda: None)
+
+    start = time.perf_counter()
+    backend = make_backend(backend_name, dispatcher.keywords())
+    print(f"Loaded the {backend.name} backend in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    latencies = []
+    correct = 0
+    for path in args:
+        pcm, sample_rate = read_wav(path)
+        expected = dispatcher.match(os.path.splitext(os.path.basename(path))[0].replace("_", " "))
+        start = time.perf_counter()
+        try:
+            text = backend.transcribe(pcm, sample_rate)
+        except RecognitionError as e:
+            text = None
+            print(e)
+        latencies.append(time.perf_counter() - start)
+        heard = dispatcher.match(text) if text else None
+        correct += heard == expected
+        print(f"{os.path.basename(path):32} {latencies[-1] * 1000:7.0f} ms  heard {text!r:28} -> {heard!r:14} (expected {expected!r})")
+
+    latencies.sort()
+    print(f"{len(args)} recordings: median {latencies[len(latencies) // 2] * 1000:.0f} ms, max {latencies[-1] * 1000:.0f} ms, "
+          f"{correct}/{len(args)} keywords correct")
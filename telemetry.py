@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+
+# Servo telemetry - physical angle, temperature and input voltage of every servo in one sweep of the bus
+# The query packets are encoded once up front and the sweep goes straight from one answer to the next query with no sleeps.
+# Reads are still one query and one answer at a time since the bus is half duplex.
+# TelemetryPoller reads the servos on a background thread while the robot walks, taking turns with the gait on the bus one
+# query at a time, and stores the samples in a TelemetryRing that the control loop or a UI can read without waiting or allocating.
+# Given a BusArbiter, the queries go through the arbiter thread at query priority, behind any gait frames that are waiting.
+
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from control_loop import ControlLoop
+from lx16a import *
+from lx16a_protocol import SERVO_POS_READ, SERVO_TEMP_READ, SERVO_VIN_READ, bus_lock, checksum, encode_packet, from_servo_range
+
+# One sweep of the bus - timestamp on the monotonic clock, then one entry per servo in the order they were given
+# angles in degrees, temps in degrees Celsius, vins in millivolts
+TelemetrySnapshot = namedtuple("TelemetrySnapshot", ["timestamp", "ids", "angles", "temps", "vins"])
+
+
+# Function to send a pre-encoded query and return the parameters of the answer - raises the same errors as the lx16a getters
+def query(packet, servo_id, num_params, arbiter=None):
+    if arbiter is not None:
+        received = arbiter.query(packet, num_params + 6)
+    else:
+        with bus_lock:
+            LX16A._controller.write(packet)
+            received = LX16A._controller.read(num_params + 6)
+    if len(received) != num_params + 6:
+        raise ServoTimeoutError(f"Servo {servo_id}: {len(received)} bytes (expected {num_params})", servo_id)
+    if checksum(received, 0, len(received) - 1) != received[-1]:
+        raise ServoChecksumError(f"Servo {servo_id}: bad checksum", servo_id)
+    return received[5:-1]
+
+
+class TelemetryReader:
+    # servos  - LX16A objects (or servo IDs) to read, in the order the snapshot lists them
+    # arbiter - BusArbiter that owns the bus, or None to query the port directly
+    def __init__(self, servos, arbiter=None):
+        self.arbiter = arbiter
+        self.ids = tuple(servo if isinstance(servo, int) else servo.get_id() for servo in servos)
+        self._queries = [
+            (servo_id,
+             encode_packet(servo_id, SERVO_POS_READ),
+             encode_packet(servo_id, SERVO_TEMP_READ),
+             encode_packet(servo_id, SERVO_VIN_READ))
+            for servo_id in self.ids
+        ]
+
+    # Function to read the servo at position index - returns (angle, temp, vin)
+    def read_servo(self, index):
+        servo_id, angle_query, temp_query, vin_query = self._queries[index]
+        received = query(angle_query, servo_id, 2, self.arbiter)
+        angle = received[0] + received[1] * 256
+        angle = from_servo_range(angle - 65536 if angle > 32767 else angle)
+        temp = query(temp_query, servo_id, 1, self.arbiter)[0]
+        received = query(vin_query, servo_id, 2, self.arbiter)
+        return angle, temp, received[0] + received[1] * 256
+
+    # Function to read every servo once - returns a TelemetrySnapshot
+    def read(self):
+        angles = []
+        temps = []
+        vins = []
+        for index in range(len(self.ids)):
+            angle, temp, vin = self.read_servo(index)
+            angles.append(angle)
+            temps.append(temp)
+            vins.append(vin)
+        return TelemetrySnapshot(time.monotonic(), self.ids, tuple(angles), tuple(temps), tuple(vins))
+
+
+# Function to read the telemetry of a list of servos once
+def read_telemetry(servos, arbiter=None):
+    return TelemetryReader(servos, arbiter).read()
+
+
+# Fixed size history of telemetry samples per servo, backed by pre-allocated NumPy arrays
+# Each sample is (timestamp, angle, temp, vin). There is a single writer (the poller) - a sample is stored with one array
+# assignment, which runs in one step under the GIL, so readers never see half of a sample and never need a lock.
+TIMESTAMP, ANGLE, TEMP, VIN = range(4)      # column of each field in a sample
+
+
+class TelemetryRing:
+    def __init__(self, num_servos, capacity=256):
+        self.capacity = capacity
+        self.samples = np.zeros((num_servos, capacity, 4))      # history, oldest sample overwritten first
+        self.latest = np.full((num_servos, 4), np.nan)          # most recent sample of each servo (NaN until the first one)
+        self.counts = np.zeros(num_servos, dtype=np.int64)      # samples written per servo since the start
+
+    # Function to store a sample - only called by the writer thread
+    def write(self, index, timestamp, angle, temp, vin):
+        sample = (timestamp, angle, temp, vin)
+        self.samples[index, self.counts[index] % self.capacity] = sample
+        self.latest[index] = sample
+        self.counts[index] += 1
+
+    # Function to copy the history of one servo into out, oldest first - returns the number of samples copied
+    def history(self, index, out):
+        count = min(int(self.counts[index]), self.capacity, len(out))
+        end = int(self.counts[index])
+        for i in range(count):
+            out[i] = self.samples[index, (end - count + i) % self.capacity]
+        return count
+
+
+class TelemetryPoller:
+    # servos  - LX16A objects (or servo IDs) to poll
+    # rate_hz - servo reads per second, the servos are read round-robin so each one is read every len(servos) / rate_hz seconds
+    def __init__(self, servos, rate_hz=16, capacity=256, arbiter=None):
+        self.reader = TelemetryReader(servos, arbiter)
+        self.ring = TelemetryRing(len(self.reader.ids), capacity)
+        self.loop = ControlLoop(rate_hz, skip_frames=True)
+        self.errors = 0                 # reads that timed out or had a bad checksum
+        self._next = 0                  # servo read on the next tick
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self.loop.run, args=(self._poll,), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+
+    # Function to read the next servo in turn - runs on the poller thread at the loop rate
+    def _poll(self, frame):
+        if not self._running:
+            return False
+        index = self._next
+        self._next = (index + 1) % len(self.reader.ids)
+        try:
+            angle, temp, vin = self.reader.read_servo(index)
+        except ServoError:
+            self.errors += 1
+            return True
+        self.ring.write(index, time.monotonic(), angle, temp, vin)
+        return True
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+
+# Transitions - minimum jerk moves from wherever the servos are into the next motion, as short as the servos' speed allows
+# Every script starts a motion from the home pose and goes back to it with a fixed 100 ms or 1000 ms move() - too fast for a
+# big move (the current spikes) and too slow for a small one (the robot stands waiting), and a new command always goes through
+# home first. Here a transition is a quintic from the start angle and velocity to the end angle and velocity with no
+# acceleration at either end, which with both velocities zero is the minimum jerk profile 10s^3 - 15s^4 + 6s^5. Its peak speed
+# is 1.875 * distance / duration, so the duration is the shortest that keeps every joint under max_speed:
+#   duration = max over joints of 1.875 * |end - start| / max_speed
+# (lengthened if the start or end velocity pushes the peak higher). The start is the last frame sent, or the angle read back by
+# the telemetry poller when the servo has been read since its last move finished, e.g. when the robot has been standing.
+
+import math
+
+import numpy as np
+
+from telemetry import ANGLE, TIMESTAMP
+
+MAX_SPEED = 180.0       # degrees per second, about half the LX-16A's no-load speed (0.16 s / 60 degrees at 7.4 V)
+PEAK_FACTOR = 1.875     # peak speed of a minimum jerk move over its average speed
+
+
+# Function to get the quintic at s (0 - 1) from p0 moving at v0 to p1 moving at v1, duration seconds long, zero acceleration at both
+# ends - s is (N, 1), the rest (J,), returns angles and velocities (per second), both (N, J)
+def quintic(p0, v0, p1, v1, duration, s):
+    s2 = s * s
+    s3 = s2 * s
+    s4 = s3 * s
+    s5 = s4 * s
+    rise = 10 * s3 - 15 * s4 + 6 * s5                          # 0 -> 1 with zero velocity and acceleration at both ends
+    leave = (s - 6 * s3 + 8 * s4 - 3 * s5) * duration          # unit velocity at the start
+    arrive = (-4 * s3 + 7 * s4 - 3 * s5) * duration            # unit velocity at the end
+    angles = p0 + (p1 - p0) * rise + v0 * leave + v1 * arrive
+    d_rise = (30 * s2 - 60 * s3 + 30 * s4) / duration
+    velocities = (p1 - p0) * d_rise + v0 * (1 - 18 * s2 + 32 * s3 - 15 * s4) + v1 * (-12 * s2 + 28 * s3 - 15 * s4)
+    return angles, velocities
+
+
+# Function to get the shortest transition time that keeps every joint's speed under max_speed (degrees per second, one number or
+# one per joint) - 0 when there is nothing to do
+def transition_time(start, end, max_speed=MAX_SPEED, start_velocity=0.0, end_velocity=0.0):
+    p0 = np.asarray(start, dtype=np.float64)
+    p1 = np.asarray(end, dtype=np.float64)
+    v0 = np.broadcast_to(np.asarray(start_velocity, dtype=np.float64), p0.shape)
+    v1 = np.broadcast_to(np.asarray(end_velocity, dtype=np.float64), p0.shape)
+    limit = np.maximum(max_speed, np.maximum(np.abs(v0), np.abs(v1)))     # a motion already faster than max_speed keeps its speed
+    duration = (PEAK_FACTOR * np.abs(p1 - p0) / limit).max()
+    if not v0.any() and not v1.any():
+        return duration
+    s = np.linspace(0, 1, 65)[:, np.newaxis]
+    duration = max(duration, 1e-3)
+    for _ in range(20):                                 # the peak speed shrinks as the duration grows, it settles in a few passes
+        _, velocities = quintic(p0, v0, p1, v1, duration, s)
+        over = (np.abs(velocities) / limit).max()
+        if over <= 1.001:
+            break
+        duration *= over
+    return duration
+
+
+# Function to get the frames of a transition at rate_hz - the last frame is end, none when start is already end and at rest
+def transition_frames(start, end, rate_hz, max_speed=MAX_SPEED, start_velocity=0.0, end_velocity=0.0):
+    p0 = np.asarray(start, dtype=np.float64)
+    p1 = np.asarray(end, dtype=np.float64)
+    duration = transition_time(p0, p1, max_speed, start_velocity, end_velocity)
+    num_frames = math.ceil(duration * rate_hz - 1e-9)
+    if num_frames == 0:
+        return []
+    duration = num_frames / rate_hz
+    s = (np.arange(1, num_frames + 1) / num_frames)[:, np.newaxis]
+    angles, _ = quintic(p0, np.asarray(start_velocity, dtype=np.float64), p1, np.asarray(end_velocity, dtype=np.float64), duration, s)
+    angles[-1] = p1
+    return angles.tolist()
+
+
+class TransitionPlanner:
+    # rate_hz   - frames per second the transitions are played at
+    # max_speed - degrees per second, one number or one per servo
+    # ring      - TelemetryRing with the servos in the same order as the frames (TelemetryPoller.ring), or None to always start
+    #             from the last frame sent
+    def __init__(self, rate_hz, max_speed=MAX_SPEED, ring=None):
+        self.rate_hz = rate_hz
+        self.max_speed = max_speed
+        self.ring = ring
+
+    # Function to get where the servos are - the angle read back for every servo read after settled_at (monotonic time its last
+    # move finished), the commanded angle for the rest
+    def current_pose(self, commanded, settled_at=None):
+        commanded = np.asarray(commanded, dtype=np.float64)
+        if self.ring is None:
+            return commanded
+        latest = self.ring.latest
+        fresh = latest[:, TIMESTAMP] > (settled_at if settled_at is not None else -math.inf)   # NaN before the first read
+        return np.where(fresh, latest[:, ANGLE], commanded)
+
+    # Function to plan the frames from start (moving at start_velocity) to end (moving at end_velocity), velocities in degrees
+    # per second - the last frame is end
+    def plan(self, start, end, start_velocity=0.0, end_velocity=0.0):
+        return transition_frames(start, end, self.rate_hz, self.max_speed, start_velocity, end_velocity)
+
+
+# Comparison with the fixed moves - time, speed off the start and peak speed for the moves the scripts make between motions
+if __name__ == "__main__":
+    import time
+
+    from gait_plan import load_gait
+
+    home_angles = np.array([147.36, 88.80, 133.68, 153.84, 115.44, 172.80, 130.56, 121.20])
+    rate_hz = 25
+    forward = np.array(load_gait("forward", home_angles, rate_hz))
+    trot = np.array(load_gait("trot", home_angles, rate_hz))
+
+    # What the servo does with one move(angle, time) - a straight line, the speed jumps up at the start and down at the end
+    def fixed_move(start, end, duration):
+        frames = math.ceil(duration * rate_hz)
+        return start + (end - start) * (np.arange(1, frames + 1) / frames)[:, np.newaxis]
+
+    def profile(frames, start):
+        speeds = np.abs(np.diff(np.vstack([start, frames]), axis=0)).max(axis=1) * rate_hz
+        return f"{len(frames) / rate_hz * 1000:5.0f} ms, first frame {speeds[0]:5.1f} deg/s, peak {speeds.max():5.1f} deg/s"
+
+    cases = [("home -> forward gait start", home_angles, forward[0]),
+             ("home -> trot, half a cycle in", home_angles, trot[len(trot) // 2]),
+             ("forward gait mid-cycle -> home", forward[len(forward) // 4], home_angles),
+             ("forward mid-cycle -> trot start", forward[len(forward) // 4], trot[0])]
+    for name, start, end in cases:
+        print(f"{name}:")
+        for fixed in (0.1, 1.0):
+            print(f"  move() over {fixed * 1000:4.0f} ms: {profile(fixed_move(start, end, fixed), start)}")
+        frames = transition_frames(start, end, rate_hz)
+        if frames:
+            print(f"  minimum jerk:        {profile(np.array(frames), start)}")
+        else:
+            print(f"  minimum jerk:        nothing to do, already there")
+
+    # Preempting a walk - straight from the middle of the forward gait, moving, into the trot at its own speed, no stop at home
+    velocity = (forward[7] - forward[5]) * rate_hz / 2
+    entry_velocity = (trot[1] - trot[0]) * rate_hz
+    frames = transition_frames(forward[6], trot[0], rate_hz, MAX_SPEED, velocity, entry_velocity)
+    via_home = len(transition_frames(forward[6], home_angles, rate_hz)) + len(transition_frames(home_angles, trot[0], rate_hz))
+    print(f"Forward -> trot while walking: {len(frames) / rate_hz * 1000:.0f} ms, through the home pose "
+          f"{via_home / rate_hz * 1000:.0f} ms and standing still in between")
+
+    start = time.perf_counter()
+    for _ in range(1000):
+        transition_frames(forward[6], trot[0], rate_hz, MAX_SPEED, velocity, entry_velocity)
+    print(f"Planning one transition: {(time.perf_counter() - start) * 1000:.0f} us")
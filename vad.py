@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+
+# Voice activity detection - decides for each chunk of 16 bit microphone audio whether someone is talking
+# detect_audio_activity used to take max() over the raw bytes of a chunk and compare it against 50, so the low byte of almost any
+# sample set it off and the recognizer was woken constantly. Here the chunk is viewed as int16 samples (np.frombuffer, no copy)
+# and split into 10 ms windows. A window is voiced when its RMS level is well above the background noise level and its
+# zero-crossing rate is in the range of speech rather than hiss. A chunk counts as speech once enough of its windows are voiced
+# for onset chunks in a row, and stays speech for hangover chunks after the last one, so the gaps between words (and the hissy
+# s, sh and f sounds, which do not count as voiced) do not end an utterance. The noise level adapts continuously: it falls
+# quickly when the room gets quieter and rises slowly when it gets louder.
+
+import numpy as np
+
+WINDOW_SECONDS = 0.01
+
+
+class VoiceActivityDetector:
+    # ratio           - how many times louder than the noise level a window has to be to be voiced
+    # max_zcr         - zero crossings per sample above which a window is hiss or a servo whining, not a voice
+    # voiced_fraction - fraction of the windows of a chunk that have to be voiced
+    # onset           - voiced chunks in a row before speech starts, so single clicks and bumps are ignored
+    # hangover        - chunks that stay speech after the last voiced one
+    # rise, fall      - how fast the noise level follows the level of unvoiced windows when it goes up and down
+    # min_level       - lowest noise level, so a silent room does not make every click count as speech
+    def __init__(self, sample_rate=16000, ratio=3.0, max_zcr=0.25, voiced_fraction=0.5, onset=2, hangover=8,
+                 rise=0.01, fall=0.2, min_level=100.0):
+        self.window = max(1, round(sample_rate * WINDOW_SECONDS))
+        self.ratio = ratio
+        self.max_zcr = max_zcr
+        self.voiced_fraction = voiced_fraction
+        self.onset = onset
+        self.hangover = hangover
+        self.rise = rise
+        self.fall = fall
+        self.min_level = min_level
+        self.noise_level = None
+        self.level = 0.0                # RMS of the last chunk
+        self.zcr = 0.0                  # zero crossings per sample of the last chunk
+        self._voiced_run = 0
+        self._hangover_left = 0
+        self._squares = np.empty(0, dtype=np.float32)
+
+    # Function to compute the RMS level and zero-crossing rate of each window of a chunk
+    def features(self, chunk):
+        samples = np.frombuffer(chunk, dtype="<i2")
+        num_windows = len(samples) // self.window
+        windows = samples[:num_windows * self.window].reshape(num_windows, self.window)
+        if self._squares.shape != windows.shape:
+            self._squares = np.empty(windows.shape, dtype=np.float32)
+        np.square(windows, out=self._squares, dtype=np.float32)
+        levels = np.sqrt(self._squares.mean(axis=1))
+        negative = windows < 0
+        zcrs = np.count_nonzero(negative[:, 1:] != negative[:, :-1], axis=1) / self.window
+        return levels, zcrs
+
+    # Function to classify the next chunk of 16 bit mono PCM - returns True while someone is talking
+    def is_speech(self, chunk):
+        levels, zcrs = self.features(chunk)
+        if not len(levels):
+            return self._hangover_left > 0
+        self.level = float(levels.mean())
+        self.zcr = float(zcrs.mean())
+        if self.noise_level is None:
+            self.noise_level = max(float(np.median(levels)), self.min_level)      # the first chunk seeds the noise level
+
+        voiced = (levels > self.noise_level * self.ratio) & (zcrs < self.max_zcr)
+        if np.count_nonzero(voiced) >= self.voiced_fraction * len(levels):
+            self._voiced_run += 1
+        else:
+            self._voiced_run = 0
+            quiet = levels[~voiced]
+            if len(quiet):
+                level = float(quiet.mean())
+                rate = self.fall if level < self.noise_level else self.rise
+                self.noise_level = max(self.noise_level + rate * (level - self.noise_level), self.min_level)
+
+        if self._voiced_run >= self.onset:
+            self._hangover_left = self.hangover
+            return True
+        if self._hangover_left > 0:
+            self._hangover_left -= 1
+            return True
+        return False
+
+
+# False-wake measurement - a corpus of synthetic noise and speech wav files is written to a temporary directory and streamed
+# through the old max-over-bytes check, the detector and the voice pipeline's utterance segmenter
+if __name__ == "__main__":
+    import os
+    import sys
+    import tempfile
+    import time
+    import wave
+
+    from voice_pipeline import CHUNK_SAMPLES, SAMPLE_RATE, UtteranceSegmenter
+
+    rng = np.random.default_rng(1)
+    rate = SAMPLE_RATE
+    t = np.arange(10 * rate) / rate                     # 10 s per file
+
+    # Function to make a speech-like signal - voiced harmonics at a wandering pitch, syllables at about 4 Hz and some hiss
+    def speech(duration, level):
+        n = int(duration * rate)
+        pitch = 140 + 30 * np.sin(2 * np.pi * 0.7 * t[:n])
+        phase = 2 * np.pi * np.cumsum(pitch) / rate
+        voiced = sum(np.sin(k * phase) / k for k in range(1, 8))
+        syllables = np.clip(np.sin(2 * np.pi * 4 * t[:n]), 0, None) ** 0.5
+        return level * voiced * syllables + 0.05 * level * rng.normal(size=n) * syllables
+
+    def with_gaps(signal, start, stop):                 # speech between start and stop seconds, silence around it
+        out = np.zeros(len(t))
+        out[int(start * rate):int(start * rate) + len(signal)] = signal[:int((stop - start) * rate)]
+        return out
+
+    noise = {
+        "white noise": rng.normal(0, 300, len(t)),
+        "fan hum": 600 * np.sin(2 * np.pi * 120 * t) + 200 * np.sin(2 * np.pi * 240 * t) + rng.normal(0, 100, len(t)),
+        "servo whine": (rng.normal(0, 100, len(t)) + 1500 * np.sin(2 * np.pi * 3200 * t) * (np.sin(2 * np.pi * 0.5 * t) > 0.6)),
+        "clicks": rng.normal(0, 80, len(t)) + np.where(rng.random(len(t)) < 0.0005, 20000, 0),
+        "noise getting louder": rng.normal(0, 1, len(t)) * np.linspace(100, 1500, len(t)),
+    }
+    commands = {
+        "command in quiet": with_gaps(speech(1.5, 3000), 2, 3.5) + with_gaps(speech(1.0, 3000), 6, 7) + rng.normal(0, 80, len(t)),
+        "command over fan": with_gaps(speech(1.5, 4000), 2, 3.5) + with_gaps(speech(1.0, 4000), 6, 7) + noise["fan hum"],
+        "quiet command over noise": with_gaps(speech(1.5, 2000), 2, 3.5) + with_gaps(speech(1.0, 2000), 6, 7) + rng.normal(0, 300, len(t)),
+    }
+
+    corpus_dir = tempfile.mkdtemp()
+    paths = {}
+    for name, signal in list(noise.items()) + list(commands.items()):
+        path = os.path.join(corpus_dir, f"{name}.wav")
+        with wave.open(path, "wb") as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(rate)
+            f.writeframes(np.clip(signal, -32768, 32767).astype("<i2").tobytes())
+        paths[name] = path
+
+    def read_chunks(path, chunk_samples):
+        with wave.open(path, "rb") as f:
+            data = f.readframes(f.getnframes())
+        size = 2 * chunk_samples
+        return [data[i:i + size] for i in range(0, len(data) - size + 1, size)]
+
+    print(f"{'file':26} {'old check':>10} {'VAD speech':>11} {'utterances':>11}")
+    false_wakes = 0
+    noise_seconds = 0.0
+    detection_time = 0.0
+    num_chunks = 0
+    missed = 0
+    for name, path in paths.items():
+        old = read_chunks(path, 1024)                   # what detect_audio_activity read
+        old_wakes = sum(max(chunk) > 50 for chunk in old) / len(old)
+
+        detector = VoiceActivityDetector(rate)
+        segmenter = UtteranceSegmenter(detector, CHUNK_SAMPLES / rate)
+        chunks = read_chunks(path, CHUNK_SAMPLES)
+        speech_chunks = 0
+        utterances = 0
+        start = time.perf_counter()
+        for chunk in chunks:
+            utterances += segmenter.push(chunk) is not None
+            speech_chunks += segmenter.detector._hangover_left > 0
+        detection_time += time.perf_counter() - start
+        num_chunks += len(chunks)
+
+        if name in noise:
+            false_wakes += utterances
+            noise_seconds += len(t) / rate
+        else:
+            missed += max(0, 2 - utterances)
+        print(f"{name:26} {old_wakes:9.0%} {speech_chunks / len(chunks):10.0%} {utterances:11}")
+
+    chunk_seconds = CHUNK_SAMPLES / rate
+    print(f"False wakes: {false_wakes} in {noise_seconds:.0f} s of noise ({false_wakes / noise_seconds * 60:.1f} per minute), "
+          f"{missed} of {2 * len(commands)} commands missed")
+    print(f"{detection_time / num_chunks * 1e6:.0f} us per {chunk_seconds * 1000:.0f} ms chunk "
+          f"({detection_time / (num_chunks * chunk_seconds):.2%} of one core)")
+    if false_wakes or missed:
+        sys.exit(1)
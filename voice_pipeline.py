@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+
+# Voice pipeline - one microphone stream that stays open, feeding capture -> segmentation -> recognition -> dispatch threads
+# The main loop used to open a new sr.Microphone twice per command and run adjust_for_ambient_noise (about 1 s each time) before
+# it even started listening. Here the stream is opened once and read in 30 ms chunks. The voice activity detector (vad.py)
+# keeps a running estimate of the background noise level, updated on every quiet chunk, and the segmenter cuts the audio into
+# utterances. Each stage runs on its own thread and hands its output to the next through a queue, so the microphone keeps being
+# read while a command is being recognized or the robot is acting on the previous one, and the time from the end of a command
+# to its action is the recognizer's own time.
+
+import queue
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from vad import VoiceActivityDetector
+
+SAMPLE_RATE = 16000
+CHUNK_SAMPLES = 480                 # 30 ms at 16 kHz
+
+
+# Cuts a stream of chunks into utterances - from a little before the first speech chunk until hangover seconds of quiet
+class UtteranceSegmenter:
+    # chunk_seconds - length of one chunk
+    # pre_roll      - seconds of audio kept from before speech was detected, so the start of the first word is not cut off
+    # hangover      - seconds of quiet that end an utterance
+    # min_length    - utterances with less speech than this are dropped as clicks and bumps
+    # max_length    - utterances are cut off at this length
+    def __init__(self, detector, chunk_seconds, pre_roll=0.3, hangover=0.6, min_length=0.2, max_length=5.0):
+        self.detector = detector
+        self._pre_roll = deque(maxlen=max(1, round(pre_roll / chunk_seconds)))
+        self._hangover_chunks = max(1, round(hangover / chunk_seconds))
+        self._min_chunks = max(1, round(min_length / chunk_seconds))
+        self._max_chunks = max(1, round(max_length / chunk_seconds))
+        self._chunks = None             # chunks of the utterance being collected, None while waiting for speech
+        self._speech_chunks = 0
+        self._quiet_chunks = 0
+
+    # Function to add the next chunk - returns the PCM of an utterance when one ends, else None
+    def push(self, chunk):
+        speech = self.detector.is_speech(chunk)
+        if self._chunks is None:
+            if not speech:
+                self._pre_roll.append(chunk)
+                return None
+            self._chunks = list(self._pre_roll)
+            self._pre_roll.clear()
+            self._speech_chunks = 0
+            self._quiet_chunks = 0
+
+        self._chunks.append(chunk)
+        if speech:
+            self._speech_chunks += 1
+            self._quiet_chunks = 0
+        else:
+            self._quiet_chunks += 1
+        if self._quiet_chunks < self._hangover_chunks and len(self._chunks) < self._max_chunks:
+            return None
+
+        chunks = self._chunks
+        self._chunks = None
+        if self._speech_chunks < self._min_chunks:
+            return None
+        return b"".join(chunks)
+
+
+class VoicePipeline:
+    # backend  - SpeechBackend used to transcribe each utterance
+    # dispatch - called with the text of each command on the dispatch thread, e.g. process_command
+    # detector - voice activity detector with an is_speech(chunk) method, defaults to a VoiceActivityDetector
+    def __init__(self, backend, dispatch, sample_rate=SAMPLE_RATE, chunk_samples=CHUNK_SAMPLES, detector=None, device_index=None):
+        self.backend = backend
+        self.dispatch = dispatch
+        self.sample_rate = sample_rate
+        self.chunk_samples = chunk_samples
+        self.device_index = device_index
+        self.segmenter = UtteranceSegmenter(detector or VoiceActivityDetector(sample_rate), chunk_samples / sample_rate)
+        self.latencies = deque(maxlen=100)      # (recognition, end of utterance to dispatch) in seconds, most recent commands
+        self.dropped_chunks = 0                 # chunks thrown away because segmentation fell behind the microphone
+        self._chunks = queue.Queue(maxsize=100)
+        self._utterances = queue.Queue()
+        self._commands = queue.Queue()
+        self._threads = []
+        self._running = False
+        self._audio = None
+        self._stream = None
+
+    # Function to open the microphone and start every stage - with capture=False nothing is read, chunks come from feed()
+    def start(self, capture=True):
+        self._running = True
+        stages = [self._segment, self._recognize, self._dispatch]
+        if capture:
+            import pyaudio
+            self._audio = pyaudio.PyAudio()
+            self._stream = self._audio.open(format=pyaudio.paInt16, channels=1, rate=self.sample_rate, input=True,
+                                            frames_per_buffer=self.chunk_samples, input_device_index=self.device_index)
+            stages.insert(0, self._capture)
+        self._threads = [threading.Thread(target=stage, daemon=True) for stage in stages]
+        for thread in self._threads:
+            thread.start()
+
+    # Function to stop every stage and close the microphone - a command being acted on is finished first
+    def stop(self):
+        self._running = False
+        self._chunks.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        if self._stream is not None:
+            self._stream.stop_stream()
+            self._stream.close()
+            self._audio.terminate()
+            self._stream = None
+
+    # Function to add a chunk of 16 bit mono PCM as if it came from the microphone
+    def feed(self, chunk):
+        try:
+            self._chunks.put_nowait((chunk, time.monotonic()))
+        except queue.Full:
+            self.dropped_chunks += 1
+
+    # Capture thread - reads the microphone
+    def _capture(self):
+        while self._running:
+            self.feed(self._stream.read(self.chunk_samples, exception_on_overflow=False))
+
+    # Segmentation thread - voice activity detection and cutting the stream into utterances
+    def _segment(self):
+        while True:
+            item = self._chunks.get()
+            if item is None:
+                break
+            chunk, captured = item
+            utterance = self.segmenter.push(chunk)
+            if utterance is not None:
+                self._utterances.put((utterance, captured))
+        self._utterances.put(None)
+
+    # Recognition thread
+    def _recognize(self):
+        while True:
+            item = self._utterances.get()
+            if item is None:
+                break
+            utterance, ended = item
+            start = time.monotonic()
+            try:
+                text = self.backend.transcribe(utterance, self.sample_rate)
+            except Exception as e:
+                print(f"\nCould not request results; {e}")
+                continue
+            if text is None:
+                print("\nCould not understand audio")
+                continue
+            self._commands.put((text, ended, time.monotonic() - start))
+        self._commands.put(None)
+
+    # Dispatch thread - acts on one command at a time while the other stages keep listening
+    def _dispatch(self):
+        while True:
+            item = self._commands.get()
+            if item is None:
+                break
+            text, ended, recognition = item
+            self.latencies.append((recognition, time.monotonic() - ended))
+            print("Command:", text)
+            try:
+                self.dispatch(text)
+            except Exception as e:                  # a failed command must not stop the next one (e.g. "stop") being acted on
+                print(f"\nCommand {text!r} failed; {e}")
+
+    # Function to format the latency stats for printing
+    def report(self):
+        if not self.latencies:
+            return "No commands yet"
+        recognition = sorted(latency[0] for latency in self.latencies)
+        total = sorted(latency[1] for latency in self.latencies)
+        middle = len(total) // 2
+        return (f"{len(total)} commands: end of speech to action median {total[middle] * 1000:.0f} ms (max {total[-1] * 1000:.0f} ms), "
+                f"recognition median {recognition[middle] * 1000:.0f} ms, {self.dropped_chunks} chunks dropped")
+
+
+# Benchmark - end of command to action latency for a stream of synthetic commands in background noise
+# The recognizer is a stand-in that takes a fixed 50 ms, so anything above that is the pipeline's own latency
+# (the hangover that decides the command is over is counted from the last chunk, so it is not part of the latency).
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    chunk_seconds = CHUNK_SAMPLES / SAMPLE_RATE
+    recognizer_time = 0.05
+
+    class FixedCostBackend:
+        name = "fixed cost"
+
+        def transcribe(self, pcm, sample_rate):
+            time.sleep(recognizer_time)
+            return "hello"
+
+    heard = []
+
+    # The first command fails, like a missing sound clip would - the rest still have to be acted on
+    def act(text):
+        heard.append(text)
+        if len(heard) == 1:
+            raise FileNotFoundError("Minion whistle.wav")
+
+    pipeline = VoicePipeline(FixedCostBackend(), act)
+    pipeline.start(capture=False)
+
+    def chunks(seconds, speech):
+        t = np.arange(CHUNK_SAMPLES) / SAMPLE_RATE
+        for i in range(round(seconds / chunk_seconds)):
+            samples = rng.normal(0, 150, CHUNK_SAMPLES)                     # background noise
+            if speech:
+                samples += 4000 * np.sin(2 * np.pi * 180 * (t + i * chunk_seconds)) * (0.6 + 0.4 * np.sin(2 * np.pi * 3 * i * chunk_seconds))
+            yield samples.astype("<i2").tobytes()
+
+    num_commands = 10
+    for _ in range(num_commands):
+        for speech, seconds in ((False, 1.0), (True, 0.8), (False, 1.0)):
+            for chunk in chunks(seconds, speech):
+                pipeline.feed(chunk)
+                time.sleep(chunk_seconds / 10)          # 10x faster than real time
+    time.sleep(0.5)
+    pipeline.stop()
+
+    print(f"Heard {len(heard)} of {num_commands} commands, noise level {pipeline.segmenter.detector.noise_level:.0f}")
+    print(pipeline.report())